@@ -0,0 +1,388 @@
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import app
+
+# Local HTTP API over the same helpers as the UI, for scripts, shortcuts and
+# syncing from other tools without a Streamlit rerun per request:
+#   python api.py [--host 127.0.0.1] [--port 8502]
+# Every request needs "Authorization: Bearer <token>" with a token from
+# `python manage.py create-token <username>`. Bodies and responses are JSON, and
+# amounts are decimal strings in the expense's currency.
+#
+#   GET    /expenses?start=&end=&category=&cursor=&page_size=  one page, newest first
+#   GET    /expenses/stream?start=&end=&category=              every match as one streamed array
+#   GET    /summary?start=&end=&category=                      count and home-currency total
+#   POST   /expenses        {"date", "category", "description", "amount", "currency", "receipt"}
+#   POST   /expenses/batch  [expense, ...]
+#   DELETE /expenses/<id>
+#   GET    /budgets
+#   PUT    /budgets/<category>  {"monthly_limit"}
+#   DELETE /budgets/<category>
+#
+# "receipt" is an optional base64 image. Reads are served from the query cache
+# like a rerun is, and writes go through the write queue, so requests arriving
+# together share commits. The server runs on one event loop and hands blocking
+# reads to threads.
+MAX_BODY_BYTES = 32 * 1024 * 1024  # room for a large batch or a receipt photo
+MAX_BATCH_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+CURRENCY_PATTERN = re.compile(r'[A-Z]{3}')
+MAX_PAISE = 2 ** 63 - 1  # largest value an SQLite INTEGER column holds
+REASONS = {
+    200: 'OK', 201: 'Created', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error',
+}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+Request = namedtuple('Request', ['method', 'path', 'query', 'headers', 'body'])
+
+# Request parsing
+def parse_date(value, field):
+    if not isinstance(value, str) or not DATE_PATTERN.fullmatch(value):
+        raise ApiError(400, f'{field} must be a YYYY-MM-DD date')
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(400, f'{field} must be a YYYY-MM-DD date')
+
+def parse_amount(value, field):
+    # Numbers and strings are both read as decimals, so 0.1 stays exactly 0.1
+    try:
+        amount = Decimal(str(value)) if isinstance(value, (str, int, float)) and not isinstance(value, bool) else None
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite() or amount < 0:
+        raise ApiError(400, f'{field} must be a non-negative amount')
+    try:
+        paise = app.to_paise(amount)
+    except ArithmeticError:  # InvalidOperation from quantize on huge exponents
+        paise = None
+    if paise is None or paise > MAX_PAISE:
+        raise ApiError(400, f'{field} is too large')
+    return paise
+
+def parse_category(value):
+    category = app.known_category(value) if isinstance(value, str) else None
+    if category is None:
+        raise ApiError(400, f"category must be one of {', '.join(app.EXPENSE_CATEGORIES)}")
+    return category
+
+def parse_filters(query):
+    start = parse_date(query['start'], 'start') if 'start' in query else None
+    end = parse_date(query['end'], 'end') if 'end' in query else None
+    category = parse_category(query['category']) if 'category' in query else None
+    return start, end, category
+
+def parse_expense(item):
+    # The add_expense arguments after the tenant
+    if not isinstance(item, dict):
+        raise ApiError(400, 'An expense must be a JSON object')
+    description = item.get('description', '')
+    if not isinstance(description, str):
+        raise ApiError(400, 'description must be a string')
+    currency = item.get('currency', app.HOME_CURRENCY)
+    if not isinstance(currency, str) or not CURRENCY_PATTERN.fullmatch(currency):
+        raise ApiError(400, 'currency must be a three-letter code such as USD')
+    receipt = item.get('receipt')
+    if receipt is not None:
+        try:
+            receipt = base64.b64decode(receipt, validate=True)
+        except (TypeError, binascii.Error):
+            raise ApiError(400, 'receipt must be a base64 image')
+    return (parse_date(item.get('date'), 'date').isoformat(), parse_category(item.get('category')), description,
+            parse_amount(item.get('amount'), 'amount'), receipt, currency)
+
+def json_body(request):
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        raise ApiError(400, 'The request body must be JSON')
+
+# Responses
+def expense_json(expense_id, day, category, description, amount_paise, currency):
+    return {
+        'id': expense_id,
+        'date': day,
+        'category': category,
+        'description': description,
+        'amount': app.format_rupees(amount_paise),
+        'currency': currency,
+    }
+
+# Turning a frame into JSON costs far more than the cached read behind it, so the
+# encoded bodies of the frame-backed reads are cached the same way
+@app.cached_query
+def expense_page_body(tenant, start, end, category, cursor, page_size):
+    df, next_cursor = app.get_expense_page(tenant, start, end, category, cursor, page_size)
+    columns = zip(df['id'].tolist(), df['date'].dt.strftime('%Y-%m-%d').tolist(), df['category'].astype(str).tolist(),
+                  df['description'].tolist(), df['amount_paise'].tolist(), df['currency'].tolist(),
+                  df['receipt_hash'].tolist())
+    return json.dumps({
+        'expenses': [dict(expense_json(*row[:6]), has_receipt=isinstance(row[6], str)) for row in columns],
+        'next_cursor': ','.join(map(str, next_cursor)) if next_cursor else None,
+    }).encode()
+
+@app.cached_query
+def budgets_body(tenant):
+    df = app.get_budget_goals(tenant)
+    return json.dumps({'budgets': [
+        {'category': category, 'monthly_limit': app.format_rupees(limit)}
+        for category, limit in zip(df['category'].astype(str).tolist(), df['monthly_limit_paise'].tolist())
+    ]}).encode()
+
+def stream_json(rows):
+    # Rows from iter_expense_chunks with the home amount added, as array items
+    return ','.join(
+        json.dumps(dict(expense_json(row[0], row[1], row[2], row[3], row[4], row[5]),
+                        **{app.HOME_AMOUNT_COLUMN: app.format_rupees(row[6])}))
+        for row in rows
+    ).encode()
+
+# Handlers
+class Api:
+    def __init__(self):
+        self.storage = app.get_storage()
+        self.tenants = {}
+        self.routes = [
+            ('GET', re.compile(r'/expenses'), self.list_expenses),
+            ('GET', re.compile(r'/expenses/stream'), self.stream_expenses),
+            ('GET', re.compile(r'/summary'), self.summary),
+            ('POST', re.compile(r'/expenses'), self.add_expense),
+            ('POST', re.compile(r'/expenses/batch'), self.add_expenses),
+            ('DELETE', re.compile(r'/expenses/(\d+)'), self.delete_expense),
+            ('GET', re.compile(r'/budgets'), self.budgets),
+            ('PUT', re.compile(r'/budgets/([^/]+)'), self.set_budget),
+            ('DELETE', re.compile(r'/budgets/([^/]+)'), self.delete_budget),
+        ]
+
+    def authenticate(self, headers):
+        # Runs on a worker thread: both lookups may touch SQLite
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        user = app.api_token_user(token.strip()) if scheme.lower() == 'bearer' and token.strip() else None
+        if user is None:
+            raise ApiError(401, 'A valid bearer token is required')
+        username, user_id = user
+        # Keyed on the user id, which is never reused, so a deleted and re-created
+        # account never gets the old account's tenant
+        tenant = self.tenants.get(user_id)
+        if tenant is None:
+            # Opening runs the migration check, so it happens once per user
+            tenant = self.tenants[user_id] = self.storage.open(username)
+        if tenant is None:
+            raise ApiError(401, 'A valid bearer token is required')
+        return tenant
+
+    async def dispatch(self, request, writer):
+        allowed = []
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                allowed.append(method)
+                continue
+            tenant = await asyncio.to_thread(self.authenticate, request.headers)
+            return await handler(request, writer, tenant, *map(unquote, match.groups()))
+        if allowed:
+            raise ApiError(405, f"Use {' or '.join(allowed)} for {request.path}")
+        raise ApiError(404, f'No such endpoint: {request.path}')
+
+    async def list_expenses(self, request, writer, tenant):
+        start, end, category = parse_filters(request.query)
+        cursor = None
+        if 'cursor' in request.query:
+            day, _, expense_id = request.query['cursor'].partition(',')
+            if not expense_id.isdigit():
+                raise ApiError(400, 'cursor must be the next_cursor of the previous page')
+            cursor = (parse_date(day, 'cursor').isoformat(), int(expense_id))
+        page_size = request.query.get('page_size', str(app.EXPENSES_PAGE_SIZE))
+        if not page_size.isdigit() or not 1 <= int(page_size) <= MAX_PAGE_SIZE:
+            raise ApiError(400, f'page_size must be between 1 and {MAX_PAGE_SIZE}')
+        return 200, await asyncio.to_thread(expense_page_body, tenant, start, end, category, cursor, int(page_size))
+
+    async def stream_expenses(self, request, writer, tenant):
+        # Chunks are read on one thread of their own, as the export's connections
+        # belong to the thread that opened them, and the next chunk is only read
+        # once the client has taken the previous one
+        start, end, category = parse_filters(request.query)
+        loop = asyncio.get_running_loop()
+        reader = ThreadPoolExecutor(1)
+        chunks = app.iter_expense_chunks(tenant, start, end, category)
+        try:
+            rates = await loop.run_in_executor(reader, app.get_fx_rates, tenant.db_file)
+            writer.write(response_head(200, {'Content-Type': 'application/json', 'Transfer-Encoding': 'chunked'}))
+            separator = b'['
+            while True:
+                rows = await loop.run_in_executor(reader, next, chunks, None)
+                if rows is None:
+                    break
+                write_chunk(writer, separator + stream_json(app.with_home_amounts(rows, rates)))
+                separator = b','
+                await writer.drain()
+            write_chunk(writer, b']' if separator == b',' else b'[]')
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        except ConnectionError:
+            pass  # the client went away
+        except Exception:
+            # The status line is already out, so the client learns of the failure
+            # from the body ending without its last chunk
+            app.logger.exception('API stream failed')
+        finally:
+            await loop.run_in_executor(reader, chunks.close)
+            reader.shutdown(wait=False)
+        return None
+
+    async def summary(self, request, writer, tenant):
+        count, total = await asyncio.to_thread(app.get_expense_summary, tenant, *parse_filters(request.query))
+        return 200, {'count': count, 'total': app.format_rupees(total), 'currency': app.HOME_CURRENCY}
+
+    async def add_expense(self, request, writer, tenant):
+        await asyncio.wrap_future(app.add_expense(tenant, *parse_expense(json_body(request))))
+        return 201, {'added': 1}
+
+    async def add_expenses(self, request, writer, tenant):
+        # Every expense is checked before any is written
+        items = json_body(request)
+        if not isinstance(items, list) or not 1 <= len(items) <= MAX_BATCH_SIZE:
+            raise ApiError(400, f'The body must be a list of 1 to {MAX_BATCH_SIZE} expenses')
+        expenses = []
+        for index, item in enumerate(items):
+            try:
+                expenses.append(parse_expense(item))
+            except ApiError as e:
+                raise ApiError(400, f'Expense {index}: {e}')
+        futures = [asyncio.wrap_future(app.add_expense(tenant, *expense)) for expense in expenses]
+        await asyncio.gather(*futures)
+        return 201, {'added': len(futures)}
+
+    async def delete_expense(self, request, writer, tenant, expense_id):
+        if not await asyncio.wrap_future(app.delete_expense(tenant, int(expense_id))):
+            raise ApiError(404, f'No such expense: {expense_id}')
+        return 200, {'deleted': int(expense_id)}
+
+    async def budgets(self, request, writer, tenant):
+        return 200, await asyncio.to_thread(budgets_body, tenant)
+
+    async def set_budget(self, request, writer, tenant, category):
+        body = json_body(request)
+        if not isinstance(body, dict):
+            raise ApiError(400, 'The body must be a JSON object')
+        limit = parse_amount(body.get('monthly_limit'), 'monthly_limit')
+        await asyncio.wrap_future(app.set_budget_goal(tenant, parse_category(category), limit))
+        return 200, {'category': category, 'monthly_limit': app.format_rupees(limit)}
+
+    async def delete_budget(self, request, writer, tenant, category):
+        await asyncio.wrap_future(app.delete_budget_goal(tenant, parse_category(category)))
+        return 200, {'deleted': category}
+
+# HTTP/1.1
+def response_head(status, headers):
+    lines = [f'HTTP/1.1 {status} {REASONS[status]}'] + [f'{name}: {value}' for name, value in headers.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+def write_chunk(writer, data):
+    writer.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+
+def write_json(writer, status, payload, keep_alive):
+    # payload is a JSON-serialisable value or an already encoded body
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    writer.write(response_head(status, {
+        'Content-Type': 'application/json',
+        'Content-Length': len(body),
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    }) + body)
+
+async def read_request(reader):
+    # None once the client closes the connection between requests
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise ApiError(400, 'Malformed request line')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', ''):
+        raise ApiError(400, 'Send the body with a Content-Length')
+    length = headers.get('content-length', '0')
+    if not length.isdigit():
+        raise ApiError(400, 'Invalid Content-Length')
+    if int(length) > MAX_BODY_BYTES:
+        raise ApiError(413, f'Bodies are limited to {MAX_BODY_BYTES // 1024 // 1024} MB')
+    body = await reader.readexactly(int(length))
+    url = urlsplit(target)
+    if version == 'HTTP/1.0':
+        headers.setdefault('connection', 'close')
+    return Request(method.upper(), url.path.rstrip('/') or '/', dict(parse_qsl(url.query)), headers, body)
+
+async def serve_connection(api, reader, writer):
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                result = await api.dispatch(request, writer)
+                if result is None:  # streamed; the response ends with the connection
+                    break
+                write_json(writer, *result, keep_alive)
+            except ApiError as e:
+                write_json(writer, e.status, {'error': str(e)}, keep_alive)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                break
+            except Exception:
+                # Details stay in the log; clients only learn the request failed
+                app.logger.exception('API request failed')
+                write_json(writer, 500, {'error': REASONS[500]}, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(host, port):
+    app.init_user_db()
+    api = Api()
+    server = await asyncio.start_server(lambda reader, writer: serve_connection(api, reader, writer), host, port)
+    print(f'Serving the expense API on http://{host}:{port}', flush=True)
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the expense tracker API over local HTTP')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: this machine only)')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,29 @@
 import streamlit as st
-import pandas as pd
 import sqlite3
-from datetime import date
+from datetime import date, datetime, timedelta
 import os
 import io
-import matplotlib.pyplot as plt
 import hashlib
-from PIL import Image
 import base64
+import gzip
+import csv
+import json
+import logging
+import re
+import secrets
+import tempfile
+import threading
+import time
+import itertools
+import heapq
+import functools
+import queue
+import shutil
+from collections import OrderedDict, namedtuple
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from urllib.parse import quote, urlencode
 
 # Gruvbox theme colors
 GRUVOX_DARK = {
@@ -24,20 +40,450 @@ GRUVOX_DARK = {
 }
 
 # Helper functions (Database, Auth, etc.)
+# Connection Management
+# Every database file gets one long-lived connection shared by all sessions.
+# Streamlit runs each session on its own thread, so a connection is guarded by a
+# lock and handed out for one unit of work at a time.
+CONNECTION_IDLE_TIMEOUT = 300  # seconds an unused connection stays open
+CONNECTION_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',  # readers no longer block on a writer
+    'PRAGMA synchronous = NORMAL',  # safe with WAL, one fsync per checkpoint instead of per commit
+    'PRAGMA cache_size = -16000',  # 16 MB page cache
+    'PRAGMA mmap_size = 134217728',  # 128 MB memory-mapped reads
+    'PRAGMA temp_store = MEMORY',
+]
+
+class PooledConnection:
+    def __init__(self, db_file, serial):
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            self.conn.execute(pragma)
+        self.lock = threading.Lock()
+        self.users = 0
+        self.last_used = time.monotonic()
+        # Identifies this handle in change tokens, so a reopened connection never
+        # reuses the token of a closed one
+        self.serial = serial
+        # Bumped after every unit of work that changed rows through this connection,
+        # per scope when the work was limited to one user's rows
+        self.generation = 0
+        self.scope_generations = {}
+
+    def mark_changed(self, scope=None):
+        if scope is None:
+            self.generation += 1
+        else:
+            self.scope_generations[scope] = self.scope_generations.get(scope, 0) + 1
+
+class ConnectionPool:
+    def __init__(self, idle_timeout=CONNECTION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._connections = {}
+        # Lives on the cached pool because Streamlit re-executes this module on every rerun
+        self._serials = itertools.count()
+
+    @contextmanager
+    def connect(self, db_file, scope=None):
+        pooled = self._checkout(db_file)
+        try:
+            with pooled.lock:
+                changes = pooled.conn.total_changes
+                try:
+                    yield pooled.conn
+                    pooled.conn.commit()
+                except BaseException:
+                    pooled.conn.rollback()
+                    raise
+                finally:
+                    if pooled.conn.total_changes != changes:
+                        pooled.mark_changed(scope)
+        finally:
+            self._checkin(pooled)
+
+    def run_batch(self, db_file, writes):
+        # Applies (scope, write) pairs in one transaction and returns a (result, error)
+        # pair for each. Every write runs in its own savepoint, so one that fails is
+        # rolled back on its own and the rest still commit together.
+        pooled = self._checkout(db_file)
+        try:
+            with pooled.lock:
+                conn = pooled.conn
+                outcomes, changed = [], set()
+                try:
+                    conn.execute('BEGIN')
+                    for scope, write in writes:
+                        changes = conn.total_changes
+                        conn.execute('SAVEPOINT batch_write')
+                        try:
+                            result = write(conn)
+                        except Exception as e:
+                            conn.execute('ROLLBACK TO batch_write')
+                            conn.execute('RELEASE batch_write')
+                            outcomes.append((None, e))
+                            continue
+                        conn.execute('RELEASE batch_write')
+                        if conn.total_changes != changes:
+                            changed.add(scope)
+                        outcomes.append((result, None))
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                for scope in changed:
+                    pooled.mark_changed(scope)
+                return outcomes
+        finally:
+            self._checkin(pooled)
+
+    def change_token(self, db_file, scope=None):
+        # Changes whenever the database does: our own writes bump the generation and
+        # PRAGMA data_version moves when another connection or process commits.
+        # Writes scoped to one user leave the tokens of other scopes alone.
+        pooled = self._checkout(db_file)
+        try:
+            with pooled.lock:
+                data_version = pooled.conn.execute('PRAGMA data_version').fetchone()[0]
+                return pooled.serial, pooled.generation, pooled.scope_generations.get(scope, 0), data_version
+        finally:
+            self._checkin(pooled)
+
+    def _checkout(self, db_file):
+        with self._lock:
+            self._evict_idle()
+            pooled = self._connections.get(db_file)
+            if pooled is None:
+                pooled = self._connections[db_file] = PooledConnection(db_file, next(self._serials))
+            pooled.users += 1
+            return pooled
+
+    def _checkin(self, pooled):
+        with self._lock:
+            pooled.users -= 1
+            pooled.last_used = time.monotonic()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for db_file, pooled in list(self._connections.items()):
+            if pooled.users == 0 and now - pooled.last_used > self.idle_timeout:
+                pooled.conn.close()
+                del self._connections[db_file]
+
+    def close(self, db_file):
+        with self._lock:
+            pooled = self._connections.pop(db_file, None)
+        if pooled is not None:
+            with pooled.lock:
+                pooled.conn.close()
+
+    def close_all(self):
+        for db_file in list(self._connections):
+            self.close(db_file)
+
+@st.cache_resource
+def get_connection_pool():
+    return ConnectionPool()
+
+def db_connection(db_file, scope=None):
+    return get_connection_pool().connect(db_file, scope)
+
+def sqlite_uri(db_file, **params):
+    # Usernames end up in file names, so ?, # and % have to be escaped in a URI
+    return f'file:{quote(db_file)}?{urlencode(params)}'
+
+# Write Queue
+# Small writes from the UI go through one writer thread per database. The writer
+# takes every write that queued up while the previous commit ran and applies them
+# in a single transaction, so concurrent sessions share commits instead of taking
+# turns on the connection lock. Callers get a Future that resolves once their
+# write is committed. A writer thread exits after sitting idle for a while.
+WRITE_BATCH_MAX = 256
+WRITER_IDLE_TIMEOUT = 30  # seconds
+
+class WriteQueue:
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def submit(self, db_file, scope, write):
+        # write(conn) runs on the writer thread; its return value resolves the future.
+        # Traces are per thread, so the submitting rerun's trace travels with the
+        # write and gets a span from submit to commit, named after the helper.
+        future = Future()
+        trace = current_trace()
+        span = (trace, write.__qualname__.split('.')[0], time.perf_counter()) if trace is not None else None
+        with self._lock:
+            pending = self._queues.get(db_file)
+            if pending is None:
+                pending = self._queues[db_file] = queue.SimpleQueue()
+                threading.Thread(target=self._run, args=(db_file, pending),
+                                 name=f'writer-{db_file}', daemon=True).start()
+            pending.put((scope, write, future, span))
+        return future
+
+    def _run(self, db_file, pending):
+        while True:
+            try:
+                batch = [pending.get(timeout=WRITER_IDLE_TIMEOUT)]
+            except queue.Empty:
+                # submit() only adds to a queue it can still find, so this cannot drop a write
+                with self._lock:
+                    if pending.empty():
+                        del self._queues[db_file]
+                        return
+                continue
+            while len(batch) < WRITE_BATCH_MAX:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                outcomes = self.pool.run_batch(db_file, [(scope, write) for scope, write, _, _ in batch])
+            except Exception as e:
+                outcomes = [(None, e)] * len(batch)
+            for (_, _, future, span), (result, error) in zip(batch, outcomes):
+                if span is not None:
+                    # Before the future resolves, so the span is in by the time .result() returns
+                    trace, name, started = span
+                    trace.record(name, 'sql', started)
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+@st.cache_resource
+def get_write_queue():
+    return WriteQueue(get_connection_pool())
+
+def submit_write(tenant, write):
+    return get_write_queue().submit(tenant.db_file, tenant.user_id, write)
+
+# Query Cache
+# Results of the read helpers are kept until the database they came from changes,
+# so reruns that only toggle widgets never touch SQLite. Entries are shared between
+# sessions and evicted least recently used first once either limit is reached.
+# Cached results are shared objects: callers must not modify them in place.
+QUERY_CACHE_MAX_ENTRIES = 512
+QUERY_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+def result_size(result):
+    if hasattr(result, 'memory_usage'):  # DataFrame or Series
+        return int(result.memory_usage(index=True, deep=True).sum())
+    if isinstance(result, (bytes, str)):
+        return len(result)
+    if isinstance(result, (tuple, list)):
+        return sum(result_size(item) for item in result)
+    return 64
+
+class QueryCache:
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_or_load(self, key, token, load):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == token:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        result = load()
+        size = result_size(result)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[2]
+            self._entries[key] = (token, result, size)
+            self.size += size
+            while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.size,
+            }
+
+@st.cache_resource
+def get_query_cache():
+    return QueryCache()
+
+def cached_query(func):
+    # For read helpers whose first argument is a Tenant or a database file
+    @functools.wraps(func)
+    def wrapper(target, *args, **kwargs):
+        key = (func.__name__, target, args, tuple(sorted(kwargs.items())))
+        db_file, scope = target if isinstance(target, Tenant) else (target, None)
+        token = get_connection_pool().change_token(db_file, scope)
+        return get_query_cache().get_or_load(key, token, lambda: func(target, *args, **kwargs))
+    return wrapper
+
+# Instrumentation
+# Opt-in timing spans for the database helpers, views and chart rendering.
+# Tracing is on for a rerun when EXPENSE_TRACE=1 is set or the URL has ?debug=1;
+# the latter also shows the spans in a debug panel. The panel lays out the app's
+# queries, timings and cache stats to whoever opens it, so ?debug=1 is ignored
+# unless EXPENSE_DEBUG_PANEL=1 is set. Each traced rerun is appended
+# to EXPENSE_TRACE_FILE as one JSON line when that is set. With tracing off a
+# traced helper costs one thread-local lookup.
+TRACE_ENABLED = os.environ.get('EXPENSE_TRACE') == '1'
+DEBUG_PANEL_ENABLED = os.environ.get('EXPENSE_DEBUG_PANEL') == '1'
+TRACE_FILE = os.environ.get('EXPENSE_TRACE_FILE')
+SLOW_QUERY_MS = float(os.environ.get('EXPENSE_SLOW_QUERY_MS', 100))
+trace_state = threading.local()
+logger = logging.getLogger('expense_tracker')
+
+class RerunTrace:
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def record(self, name, kind, started, result=None):
+        ended = time.perf_counter()
+        span = {
+            'name': name,
+            'kind': kind,
+            'start_ms': round((started - self.started) * 1000, 3),
+            'ms': round((ended - started) * 1000, 3),
+        }
+        if result is not None:
+            rows = result[0] if isinstance(result, tuple) and result else result
+            if hasattr(rows, 'shape'):
+                span['rows'] = len(rows)
+            span['bytes'] = result_size(result)
+        if kind == 'sql' and span['ms'] > SLOW_QUERY_MS:
+            span['slow'] = True
+            logger.warning('Slow query: %s took %.1f ms (threshold %.0f ms)', name, span['ms'], SLOW_QUERY_MS)
+        self.spans.append(span)
+
+    def as_record(self):
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'label': self.label,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'spans': self.spans,
+        }
+
+def current_trace():
+    return getattr(trace_state, 'trace', None)
+
+def traced(kind):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = current_trace()
+            if trace is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            trace.record(func.__name__, kind, started, result)
+            return result
+        return wrapper
+    return decorator
+
+@contextmanager
+def trace_span(name, kind):
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, kind, started)
+
+def start_trace(label):
+    trace_state.trace = RerunTrace(label)
+    return trace_state.trace
+
+def finish_trace():
+    trace = current_trace()
+    trace_state.trace = None
+    if trace is not None and TRACE_FILE:
+        get_trace_writer().write(trace.as_record())
+    return trace
+
+class TraceWriter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+@st.cache_resource
+def get_trace_writer():
+    return TraceWriter(TRACE_FILE)
+
+def render_debug_panel(trace):
+    import pandas as pd
+    with st.expander("🛠️ Debug: rerun timings", expanded=False):
+        record = trace.as_record()
+        st.write(f"Rerun took **{record['total_ms']:.1f} ms** across {len(record['spans'])} spans")
+        if record['spans']:
+            spans_df = pd.DataFrame(record['spans'])
+            st.dataframe(spans_df, hide_index=True)
+            slow = [span for span in record['spans'] if span.get('slow')]
+            for span in slow:
+                st.warning(f"⚠️ Slow query: {span['name']} took {span['ms']:.1f} ms")
+        st.write("Query cache", get_query_cache().stats())
+
 # User Authentication
 USER_DB = 'users.db'
 
+@traced('sql')
 def init_user_db():
-    if not os.path.exists(USER_DB):
-        with sqlite3.connect(USER_DB) as conn:
-            conn.execute('''
-            CREATE TABLE users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL
-            )
-            ''')
-            conn.commit()
+    with db_connection(USER_DB) as conn:
+        run_migrations(conn, USER_DB_MIGRATIONS)
+
+def migrate_users_v1_base_schema(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    )
+    ''')
+
+def migrate_users_v2_api_tokens(conn):
+    # Tokens for the local API (api.py); only a hash of each token is kept
+    conn.execute('''
+    CREATE TABLE api_tokens (
+        token_hash TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        created TEXT NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX idx_api_tokens_username ON api_tokens (username)')
+
+USER_DB_MIGRATIONS = [
+    migrate_users_v1_base_schema,
+    migrate_users_v2_api_tokens,
+]
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -45,115 +491,2023 @@ def hash_password(password):
 def verify_password(stored_password, provided_password):
     return stored_password == hash_password(provided_password)
 
+@traced('sql')
 def signup_user(username, password):
     try:
-        with sqlite3.connect(USER_DB) as conn:
+        with db_connection(USER_DB) as conn:
             conn.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, hash_password(password)))
             conn.commit()
         return True
     except sqlite3.IntegrityError:
         return False
 
+@traced('sql')
+def get_user_id(username):
+    with db_connection(USER_DB) as conn:
+        row = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    return row[0] if row else None
+
+@traced('sql')
 def authenticate_user(username, password):
-    with sqlite3.connect(USER_DB) as conn:
+    with db_connection(USER_DB) as conn:
         cursor = conn.execute('SELECT password FROM users WHERE username = ?', (username,))
         result = cursor.fetchone()
         if result and verify_password(result[0], password):
             return True
     return False
 
+@traced('sql')
+def create_api_token(username):
+    # Returns the new token, which is shown once and never stored, or None for an unknown user
+    if get_user_id(username) is None:
+        return None
+    token = secrets.token_urlsafe(32)
+    with db_connection(USER_DB) as conn:
+        conn.execute('INSERT INTO api_tokens (token_hash, username, created) VALUES (?, ?, ?)',
+                     (hashlib.sha256(token.encode()).hexdigest(), username, datetime.now().isoformat(timespec='seconds')))
+        conn.commit()
+    return token
+
+@traced('sql')
+def api_token_user(token):
+    # (username, user id) of the token's owner, or None
+    with db_connection(USER_DB) as conn:
+        return conn.execute('''
+        SELECT users.username, users.id FROM api_tokens JOIN users ON users.username = api_tokens.username
+        WHERE api_tokens.token_hash = ?
+        ''', (hashlib.sha256(token.encode()).hexdigest(),)).fetchone()
+
+@traced('sql')
+def revoke_api_tokens(username):
+    with db_connection(USER_DB) as conn:
+        revoked = conn.execute('DELETE FROM api_tokens WHERE username = ?', (username,)).rowcount
+        conn.commit()
+    return revoked
+
+# Schema Migrations
+# Each database records how many migrations it has applied in PRAGMA user_version.
+# Opening a database applies the missing ones in order, each in its own transaction.
+# Append new steps to the end of a migration list; never edit one that has shipped.
+def run_migrations(conn, migrations):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    vacuum = False
+    for number, migration in enumerate(migrations[version:], start=version + 1):
+        conn.execute('BEGIN')
+        try:
+            # A migration returns True when it freed enough space to be worth a VACUUM
+            vacuum = migration(conn) or vacuum
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if vacuum:
+        conn.execute('VACUUM')
+
+# Money
+# Amounts are whole paise everywhere below the UI: in SQLite, in frames and in
+# sums, so totals are exact. Rupees only appear when reading input and showing or
+# exporting results. An expense in another currency is stored in hundredths of
+# that currency, still in amount_paise, and converted to the home currency
+# whenever totals are read (see Currency Conversion).
+HOME_CURRENCY = os.environ.get('EXPENSE_HOME_CURRENCY', 'INR')
+CURRENCY_SYMBOLS = {'INR': '₹', 'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥', 'AED': 'AED ', 'SGD': 'S$', 'THB': '฿'}
+
+def to_paise(rupees):
+    return int((Decimal(str(rupees)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def to_rupees(paise):
+    return Decimal(int(paise)).scaleb(-2)
+
+def format_rupees(paise):
+    return f'{to_rupees(paise):.2f}'
+
+def currency_symbol(currency=HOME_CURRENCY):
+    return CURRENCY_SYMBOLS.get(currency, f'{currency} ')
+
+def format_money(paise, currency=HOME_CURRENCY):
+    return f'{currency_symbol(currency)}{format_rupees(paise)}'
+
+# Typed Frames
+# Expense frames load compact: amounts as int64 paise, category as a Categorical
+# over a stable category list, and dates parsed into datetime64 once when the
+# query runs. Cached results keep these types, so reruns never parse again.
+def expense_categories(values):
+    # The built-in categories come first so codes line up across frames
+    return EXPENSE_CATEGORIES + sorted(set(values) - set(EXPENSE_CATEGORIES))
+
+def read_expense_frame(conn, sql, params=()):
+    import pandas as pd
+    return typed_expense_frame(pd.read_sql_query(sql, conn, params=params))
+
+def typed_expense_frame(df):
+    import pandas as pd
+    if 'date' in df:
+        df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    if 'category' in df:
+        df['category'] = pd.Categorical(df['category'], categories=expense_categories(df['category'].unique()))
+    for column in ('amount_paise', 'monthly_limit_paise', 'expense_count'):
+        if column in df:
+            df[column] = df[column].astype('int64')
+    return df
+
 # Expense and Budget Database Operations
+@traced('sql')
 def init_db(db_file):
-    if not os.path.exists(db_file):
-        with sqlite3.connect(db_file) as conn:
-            conn.execute('''
-            CREATE TABLE expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                category TEXT NOT NULL,
-                description TEXT,
-                amount REAL NOT NULL,
-                receipt_photo TEXT
-            )
-            ''')
-            # Also create budget_goals table
-            conn.execute('''
-            CREATE TABLE IF NOT EXISTS budget_goals (
-                category TEXT PRIMARY KEY,
-                monthly_limit REAL NOT NULL
-            )
-            ''')
+    with db_connection(db_file) as conn:
+        run_migrations(conn, EXPENSE_DB_MIGRATIONS)
+
+def migrate_v1_base_schema(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        description TEXT,
+        amount REAL NOT NULL,
+        receipt_hash TEXT
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS budget_goals (
+        category TEXT PRIMARY KEY,
+        monthly_limit REAL NOT NULL
+    )
+    ''')
+
+def migrate_v2_receipt_store(conn):
+    migrated = migrate_receipt_photos(conn)
+    init_receipt_store(conn)
+    # Give the space held by the old base64 column back to the filesystem
+    return migrated
+
+def migrate_v3_expense_indexes(conn):
+    # Serve the dashboard date-range and category filters and the (date, id) pagination
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses (category, date)')
+
+def migrate_v4_rollups(conn):
+    init_rollups(conn, ROLLUP_LAYOUT_V4)
+    rebuild_rollups(conn, layout=ROLLUP_LAYOUT_V4)
+
+def migrate_v5_import_fingerprints(conn):
+    # Imported statement rows carry a fingerprint so importing a file twice is harmless
+    conn.execute('ALTER TABLE expenses ADD COLUMN fingerprint TEXT')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_fingerprint ON expenses (fingerprint)')
+
+def migrate_v6_receipt_processing(conn):
+    # Existing receipts stay as uploaded (processed = 0) until the pipeline picks them up
+    conn.execute('ALTER TABLE receipts ADD COLUMN thumbnail BLOB')
+    conn.execute("ALTER TABLE receipts ADD COLUMN mime TEXT")
+    conn.execute('ALTER TABLE receipts ADD COLUMN processed INTEGER NOT NULL DEFAULT 0')
+
+def migrate_v7_user_ids(conn):
+    # Rows carry the user they belong to so one database can hold many users. In a
+    # per-user file every row keeps user_id 0.
+    conn.execute(f'ALTER TABLE expenses ADD COLUMN user_id INTEGER NOT NULL DEFAULT {FILE_USER_ID}')
+    conn.execute('DROP INDEX IF EXISTS idx_expenses_date')
+    conn.execute('DROP INDEX IF EXISTS idx_expenses_category_date')
+    conn.execute('DROP INDEX IF EXISTS idx_expenses_fingerprint')
+    conn.execute('CREATE INDEX idx_expenses_user_date ON expenses (user_id, date)')
+    conn.execute('CREATE INDEX idx_expenses_user_category_date ON expenses (user_id, category, date)')
+    conn.execute('CREATE UNIQUE INDEX idx_expenses_user_fingerprint ON expenses (user_id, fingerprint)')
+    conn.execute(f'''
+    CREATE TABLE budget_goals_v7 (
+        user_id INTEGER NOT NULL DEFAULT {FILE_USER_ID},
+        category TEXT NOT NULL,
+        monthly_limit REAL NOT NULL,
+        PRIMARY KEY (user_id, category)
+    )
+    ''')
+    conn.execute('INSERT INTO budget_goals_v7 (category, monthly_limit) SELECT category, monthly_limit FROM budget_goals')
+    conn.execute('DROP TABLE budget_goals')
+    conn.execute('ALTER TABLE budget_goals_v7 RENAME TO budget_goals')
+    drop_rollups(conn)
+    init_rollups(conn, ROLLUP_LAYOUT_V7)
+    rebuild_rollups(conn, layout=ROLLUP_LAYOUT_V7)
+
+def migrate_v8_integer_amounts(conn):
+    # Amounts become whole paise so sums are exact and load as int64
+    drop_rollups(conn)
+    conn.execute('ALTER TABLE expenses ADD COLUMN amount_paise INTEGER NOT NULL DEFAULT 0')
+    conn.execute('UPDATE expenses SET amount_paise = CAST(ROUND(amount * 100) AS INTEGER)')
+    conn.execute('ALTER TABLE expenses DROP COLUMN amount')
+    conn.execute('ALTER TABLE budget_goals ADD COLUMN monthly_limit_paise INTEGER NOT NULL DEFAULT 0')
+    conn.execute('UPDATE budget_goals SET monthly_limit_paise = CAST(ROUND(monthly_limit * 100) AS INTEGER)')
+    conn.execute('ALTER TABLE budget_goals DROP COLUMN monthly_limit')
+    init_rollups(conn, ROLLUP_LAYOUT_V8)
+    rebuild_rollups(conn, layout=ROLLUP_LAYOUT_V8)
+    # Dropping the REAL columns rewrote both tables
+    return True
+
+def migrate_v9_search_index(conn):
+    init_search_index(conn)
+    rebuild_search_index(conn)
+
+def migrate_v10_archive_partitions(conn):
+    # One row per archived year, naming the file under archive_dir() that holds it
+    conn.execute('''
+    CREATE TABLE archive_partitions (
+        year INTEGER PRIMARY KEY,
+        file TEXT NOT NULL,
+        expense_count INTEGER NOT NULL
+    )
+    ''')
+
+def migrate_v11_currencies(conn):
+    # Every expense records its currency; everything entered before this was in rupees.
+    # fx_rates holds how much one unit of a currency is worth in the home currency
+    # from a date on, as imported by `manage.py import-fx-rates`.
+    conn.execute("ALTER TABLE expenses ADD COLUMN currency TEXT NOT NULL DEFAULT 'INR'")
+    conn.execute('''
+    CREATE TABLE fx_rates (
+        currency TEXT NOT NULL,
+        date TEXT NOT NULL,
+        rate REAL NOT NULL,
+        PRIMARY KEY (currency, date)
+    ) WITHOUT ROWID
+    ''')
+    db_file = conn.execute('PRAGMA database_list').fetchone()[2]
+    drop_rollups(conn)
+    init_rollups(conn)
+    rebuild_rollups(conn, archived_daily_totals(conn, db_file))
+
+EXPENSE_DB_MIGRATIONS = [
+    migrate_v1_base_schema,
+    migrate_v2_receipt_store,
+    migrate_v3_expense_indexes,
+    migrate_v4_rollups,
+    migrate_v5_import_fingerprints,
+    migrate_v6_receipt_processing,
+    migrate_v7_user_ids,
+    migrate_v8_integer_amounts,
+    migrate_v9_search_index,
+    migrate_v10_archive_partitions,
+    migrate_v11_currencies,
+]
+
+# Storage Backends
+# Where each user's expenses live. By default every user has their own
+# expenses_<username>.db; with EXPENSE_STORAGE=shared all users share one database
+# and are told apart by the user_id column. Helpers that read or write a user's
+# expenses take a Tenant: the database file plus the user_id inside it.
+STORAGE_MODE = os.environ.get('EXPENSE_STORAGE', 'per-user')
+SHARED_DB = os.environ.get('EXPENSE_SHARED_DB', 'expenses.db')
+FILE_USER_ID = 0  # user_id of every row in a per-user database file
+
+Tenant = namedtuple('Tenant', ['db_file', 'user_id'])
+
+class PerUserStorage:
+    def tenant(self, username):
+        return Tenant(f'expenses_{username}.db', FILE_USER_ID)
+
+    def open(self, username):
+        # Every file is checked for pending migrations when it is opened
+        tenant = self.tenant(username)
+        init_db(tenant.db_file)
+        return tenant
+
+    def delete(self, tenant):
+        # Delete the user's expense database file along with its WAL files
+        get_connection_pool().close(tenant.db_file)
+        for path in (tenant.db_file, f'{tenant.db_file}-wal', f'{tenant.db_file}-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(archive_dir(tenant.db_file), ignore_errors=True)
+
+class SharedStorage:
+    def __init__(self, db_file=SHARED_DB):
+        self.db_file = db_file
+
+    def tenant(self, username):
+        user_id = get_user_id(username)
+        return Tenant(self.db_file, user_id) if user_id is not None else None
+
+    def open(self, username):
+        # The migration check runs against the one pooled connection every user shares
+        init_db(self.db_file)
+        return self.tenant(username)
+
+    def delete(self, tenant):
+        with db_connection(*tenant) as conn:
+            hashes = [row[0] for row in conn.execute('''
+            SELECT DISTINCT receipt_hash FROM expenses WHERE user_id = ? AND receipt_hash IS NOT NULL
+            ''', (tenant.user_id,))]
+            conn.execute('DELETE FROM expenses WHERE user_id = ?', (tenant.user_id,))
+            conn.execute('DELETE FROM budget_goals WHERE user_id = ?', (tenant.user_id,))
+            # What is left in the rollups belongs to archived years
+            for table in ROLLUP_TABLES:
+                conn.execute(f'DELETE FROM {table} WHERE user_id = ?', (tenant.user_id,))
+            # Receipts are shared by content hash, so only drop the ones nobody else uses
+            conn.executemany('''
+            DELETE FROM receipts WHERE hash = ?
+            AND NOT EXISTS (SELECT 1 FROM expenses WHERE receipt_hash = receipts.hash)
+            ''', [(receipt_hash,) for receipt_hash in hashes])
+        purge_archived_user(tenant)
+
+    def import_user_file(self, username, user_db_file):
+        # Copy one per-user database into the shared one. Users that already have
+        # expenses here are skipped, so an interrupted migration can be rerun.
+        tenant = self.open(username)
+        if tenant is None:
+            return None
+        init_db(user_db_file)
+        get_connection_pool().close(user_db_file)
+        with db_connection(*tenant) as conn:
+            # The rollups also count archived years, so users whose live rows were
+            # all archived are still recognised as copied
+            if conn.execute('SELECT 1 FROM daily_totals WHERE user_id = ? LIMIT 1', (tenant.user_id,)).fetchone():
+                return 0
+            conn.execute('ATTACH DATABASE ? AS source', (user_db_file,))
+            try:
+                archives = [
+                    os.path.join(archive_dir(user_db_file), file)
+                    for (file,) in conn.execute('SELECT file FROM source.archive_partitions ORDER BY year')
+                ]
+                conn.execute('''
+                INSERT OR IGNORE INTO receipts (hash, data, thumbnail, mime, processed)
+                SELECT hash, data, thumbnail, mime, processed FROM source.receipts
+                ''')
+                # Archived years come back into the live table; `manage.py archive`
+                # can move them out of the shared database again
+                count = 0
+                for path in archives:
+                    with closing(open_archive(path)) as archive:
+                        conn.executemany(f'''
+                        INSERT OR IGNORE INTO receipts ({ARCHIVE_RECEIPT_COLUMNS}) VALUES (?, ?, ?, ?, ?)
+                        ''', archive.execute(f'SELECT {ARCHIVE_RECEIPT_COLUMNS} FROM receipts'))
+                        count += conn.executemany('''
+                        INSERT INTO expenses (user_id, date, category, description, amount_paise, receipt_hash, fingerprint, currency)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', ((tenant.user_id,) + row for row in archive.execute('''
+                        SELECT date, category, description, amount_paise, receipt_hash, fingerprint, currency FROM expenses ORDER BY id
+                        '''))).rowcount
+                count += conn.execute('''
+                INSERT INTO expenses (user_id, date, category, description, amount_paise, receipt_hash, fingerprint, currency)
+                SELECT ?, date, category, description, amount_paise, receipt_hash, fingerprint, currency FROM source.expenses ORDER BY id
+                ''', (tenant.user_id,)).rowcount
+                conn.execute('INSERT OR IGNORE INTO fx_rates (currency, date, rate) SELECT currency, date, rate FROM source.fx_rates')
+                conn.execute('''
+                INSERT OR REPLACE INTO budget_goals (user_id, category, monthly_limit_paise)
+                SELECT ?, category, monthly_limit_paise FROM source.budget_goals
+                ''', (tenant.user_id,))
+                conn.commit()
+            except BaseException:
+                # DETACH is not allowed while the copy's transaction is still open
+                conn.rollback()
+                raise
+            finally:
+                conn.execute('DETACH DATABASE source')
+        return count
+
+STORAGE_BACKENDS = {
+    'per-user': PerUserStorage,
+    'shared': SharedStorage,
+}
+
+def get_storage():
+    return STORAGE_BACKENDS[STORAGE_MODE]()
+
+# Receipt Storage
+# Receipts live in their own table keyed by the SHA-256 of the image bytes, so
+# identical uploads are stored once and reading expenses never touches image data.
+def init_receipt_store(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS receipts (
+        hash TEXT PRIMARY KEY,
+        data BLOB NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_receipt_hash ON expenses (receipt_hash)')
+
+def migrate_receipt_photos(conn):
+    # One-time move of the old base64 receipt_photo column into the receipt store
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(expenses)')]
+    if 'receipt_photo' not in columns:
+        return False
+    if 'receipt_hash' not in columns:
+        conn.execute('ALTER TABLE expenses ADD COLUMN receipt_hash TEXT')
+    init_receipt_store(conn)
+    expense_ids = [row[0] for row in conn.execute('SELECT id FROM expenses WHERE receipt_photo IS NOT NULL')]
+    # Decode one receipt at a time so large histories are never held in memory at once
+    for expense_id in expense_ids:
+        (receipt_photo,) = conn.execute('SELECT receipt_photo FROM expenses WHERE id = ?', (expense_id,)).fetchone()
+        receipt_hash = store_receipt(conn, base64.b64decode(receipt_photo))
+        conn.execute('UPDATE expenses SET receipt_hash = ? WHERE id = ?', (receipt_hash, expense_id))
+    conn.execute('ALTER TABLE expenses DROP COLUMN receipt_photo')
+    return True
+
+# Spending Rollups
+# Per-day and per-month totals by category and currency, kept in sync with the
+# expenses table by triggers so charts and budget progress read O(days x categories)
+# rows. Totals are in each currency's own hundredths; readers convert them.
+ROLLUP_TABLES = {'daily_totals': 'date', 'monthly_totals': 'month'}
+# Columns of the rollup tables: the ones before and after the date or month in the
+# primary key, and the summed amount. Migrations build the layout of the release
+# they shipped in, so a step behaves the same however old the database it runs on.
+RollupLayout = namedtuple('RollupLayout', ['scope', 'groups', 'amount'])
+ROLLUP_LAYOUT = RollupLayout(('user_id',), ('category', 'currency'), 'amount_paise')
+ROLLUP_LAYOUT_V4 = RollupLayout((), ('category',), 'amount')
+ROLLUP_LAYOUT_V7 = RollupLayout(('user_id',), ('category',), 'amount')
+ROLLUP_LAYOUT_V8 = RollupLayout(('user_id',), ('category',), 'amount_paise')
+ROLLUP_COLUMN_TYPES = {'user_id': 'INTEGER', 'amount': 'REAL', 'amount_paise': 'INTEGER'}
+
+def init_rollups(conn, layout=ROLLUP_LAYOUT):
+    scope, groups, amount = layout
+    add_row, remove_row = [], []
+    for table, key in ROLLUP_TABLES.items():
+        keys = [*scope, key, *groups]
+        columns = ''.join(f'{column} {ROLLUP_COLUMN_TYPES.get(column, "TEXT")} NOT NULL, '
+                          for column in keys + [amount])
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            {columns}expense_count INTEGER NOT NULL,
+            PRIMARY KEY ({', '.join(keys)})
+        ) WITHOUT ROWID
+        ''')
+        new_key = 'NEW.date' if key == 'date' else 'substr(NEW.date, 1, 7)'
+        old_key = 'OLD.date' if key == 'date' else 'substr(OLD.date, 1, 7)'
+        new_values = [new_key if column == key else f'NEW.{column}' for column in keys]
+        old_match = ' AND '.join(f'{column} = {old_key}' if column == key else f'{column} = OLD.{column}' for column in keys)
+        add_row.append(f'''
+        INSERT INTO {table} ({', '.join(keys)}, {amount}, expense_count)
+        VALUES ({', '.join(new_values)}, NEW.{amount}, 1)
+        ON CONFLICT({', '.join(keys)}) DO UPDATE SET
+            {amount} = {amount} + excluded.{amount},
+            expense_count = expense_count + 1;
+        ''')
+        remove_row.append(f'''
+        UPDATE {table} SET {amount} = {amount} - OLD.{amount}, expense_count = expense_count - 1
+        WHERE {old_match};
+        DELETE FROM {table} WHERE {old_match} AND expense_count <= 0;
+        ''')
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS expenses_rollup_insert AFTER INSERT ON expenses BEGIN {''.join(add_row)} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS expenses_rollup_delete AFTER DELETE ON expenses BEGIN {''.join(remove_row)} END")
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS expenses_rollup_update AFTER UPDATE OF {', '.join([*scope, 'date', *groups, amount])} ON expenses
+    BEGIN {''.join(remove_row)} {''.join(add_row)} END
+    ''')
+
+def drop_rollups(conn):
+    for trigger in ('expenses_rollup_insert', 'expenses_rollup_delete', 'expenses_rollup_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    for table in ROLLUP_TABLES:
+        conn.execute(f'DROP TABLE IF EXISTS {table}')
+
+def rebuild_rollups(conn, archived_totals=(), layout=ROLLUP_LAYOUT):
+    # Recompute the rollups from scratch, e.g. after editing expenses outside the app.
+    # archived_totals are the daily rows of archived years (see archived_daily_totals).
+    scope, groups, amount = layout
+    daily = ', '.join([*scope, 'date', *groups])
+    monthly = ', '.join([*scope, 'substr(date, 1, 7)', *groups])
+    conn.execute('DELETE FROM daily_totals')
+    conn.execute('DELETE FROM monthly_totals')
+    conn.execute(f'''
+    INSERT INTO daily_totals ({daily}, {amount}, expense_count)
+    SELECT {daily}, SUM({amount}), COUNT(*) FROM expenses GROUP BY {daily}
+    ''')
+    conn.executemany(f'''
+    INSERT INTO daily_totals ({daily}, {amount}, expense_count) VALUES ({', '.join('?' * (len(scope) + len(groups) + 3))})
+    ON CONFLICT({daily}) DO UPDATE SET
+        {amount} = {amount} + excluded.{amount},
+        expense_count = expense_count + excluded.expense_count
+    ''', archived_totals)
+    conn.execute(f'''
+    INSERT INTO monthly_totals ({', '.join([*scope, 'month', *groups])}, {amount}, expense_count)
+    SELECT {monthly}, SUM({amount}), SUM(expense_count) FROM daily_totals GROUP BY {monthly}
+    ''')
+
+@traced('sql')
+@cached_query
+def get_daily_totals(tenant, start_date=None, end_date=None, category=None):
+    clauses, params = expense_filters(tenant, start_date, end_date, category)
+    where = f"WHERE {' AND '.join(clauses)}"
+    with db_connection(*tenant) as conn:
+        df = read_expense_frame(conn, f'''
+        SELECT date, category, currency, amount_paise, expense_count
+        FROM daily_totals {where}
+        ORDER BY date
+        ''', params)
+    return convert_totals(df, tenant.db_file, ['date', 'category'])
+
+@traced('sql')
+@cached_query
+def get_month_totals(tenant, month):
+    # month is any date inside the month. Read from the daily rollup so that days
+    # spent in another currency convert at their own rate.
+    first = month.replace(day=1)
+    with db_connection(*tenant) as conn:
+        df = read_expense_frame(conn, f'''
+        SELECT category, {FOREIGN_DATE} AS date, currency, SUM(amount_paise) AS amount_paise, SUM(expense_count) AS expense_count
+        FROM daily_totals WHERE user_id = ? AND date >= ? AND date < ?
+        GROUP BY 1, 2, 3
+        ''', [HOME_CURRENCY, tenant.user_id, first.isoformat(), month_start(first, -1).isoformat()])
+    return convert_totals(df, tenant.db_file, ['category'])
+
+# Currency Conversion
+# Totals are converted to the home currency as they are read, with the rate in
+# force on each expense's date: the latest fx_rates row for its currency on or
+# before that day. The conversion is one pandas merge_asof over all foreign rows
+# of a frame, and happens inside the cached read helpers, so reruns reuse the
+# converted totals. Queries that aggregate keep home-currency rows collapsed and
+# only split foreign rows by day (FOREIGN_DATE), so a history spent entirely at
+# home costs what it did before currencies existed.
+FOREIGN_DATE = 'CASE WHEN currency = ? THEN NULL ELSE date END'
+
+@traced('sql')
+@cached_query
+def get_fx_rates(db_file):
+    with db_connection(db_file) as conn:
+        df = read_expense_frame(conn, 'SELECT date, currency, rate FROM fx_rates ORDER BY date')
+    # An empty table loads untyped, and merge_asof needs the key types to match exactly
+    return df.astype({'date': 'datetime64[ns]', 'currency': 'str', 'rate': 'float64'})
+
+@traced('sql')
+@cached_query
+def get_fx_currencies(tenant):
+    # Currencies with rates, and the ones the user's expenses use that have none
+    with db_connection(*tenant) as conn:
+        rated = [row[0] for row in conn.execute('SELECT DISTINCT currency FROM fx_rates ORDER BY currency')]
+        used = [row[0] for row in conn.execute('''
+        SELECT DISTINCT currency FROM monthly_totals WHERE user_id = ? AND currency != ?
+        ''', (tenant.user_id, HOME_CURRENCY))]
+    return rated, sorted(set(used) - set(rated))
+
+def home_amounts(df, rates):
+    # df's amount_paise in home-currency paise. Before a currency's first rate its
+    # earliest rate applies; a currency without any rate counts as zero.
+    import numpy as np
+    import pandas as pd
+    amounts = df['amount_paise'].to_numpy(dtype='float64')
+    foreign = (df['currency'] != HOME_CURRENCY).to_numpy()
+    if foreign.any():
+        rows = pd.DataFrame({
+            'date': df['date'].to_numpy()[foreign].astype('datetime64[ns]'),
+            'currency': df['currency'].to_numpy()[foreign],
+            'position': np.flatnonzero(foreign),
+        }).sort_values('date', kind='stable')
+        matched = pd.merge_asof(rows, rates, on='date', by='currency', direction='backward')
+        earliest = rates.groupby('currency')['rate'].first()
+        rate = matched['rate'].fillna(matched['currency'].map(earliest)).fillna(0.0)
+        amounts[matched['position'].to_numpy()] *= rate.to_numpy()
+    return np.rint(amounts).astype('int64')
+
+def convert_totals(df, db_file, keys):
+    # Convert a rollup frame to the home currency and sum it back down to keys. The
+    # rates are only loaded when the frame has foreign rows.
+    converted = df.drop(columns='currency')
+    if not (df['currency'] != HOME_CURRENCY).any():
+        return converted
+    converted['amount_paise'] = home_amounts(df, get_fx_rates(db_file))
+    return converted.groupby(keys, observed=True)[['amount_paise', 'expense_count']].sum().reset_index()
+
+def import_fx_rates(db_file, rows):
+    # rows are (currency, date, rate); a later import of the same day replaces the rate
+    with db_connection(db_file) as conn:
+        conn.executemany('INSERT OR REPLACE INTO fx_rates (currency, date, rate) VALUES (?, ?, ?)', rows)
+
+def read_fx_rates_csv(stream):
+    # A CSV with date, currency and rate columns, where rate is the home-currency
+    # value of one unit of currency from that date on
+    for record in csv.DictReader(stream):
+        currency = record['currency'].strip().upper()
+        if currency != HOME_CURRENCY:
+            yield currency, parse_statement_date(record['date']).isoformat(), float(record['rate'])
+
+# Expense Search
+# An FTS5 index over expense descriptions and categories. It stores no text of
+# its own (content='expenses'); triggers feed it the old and new values of every
+# changed row. Matches are ranked by BM25 with description hits weighted above
+# category hits. Scoring touches every match, so a search matching more than
+# SEARCH_RANK_LIMIT rows (one common word over a long history) lists them newest
+# first instead, which FTS5 can stream in rowid order. Its summary stops counting
+# there too. Each archived year has its own index, and scores from different
+# indexes are not comparable, so a search reaching into archived years is listed
+# newest first as well.
+SEARCH_RANK = 'bm25(10.0, 1.0)'
+SEARCH_RANK_LIMIT = 2000
+# Matches drive the join (CROSS JOIN keeps SQLite from scanning expenses and
+# probing the index once per row); the filters then apply to the joined rows
+SEARCH_HITS = '''
+(SELECT rowid AS id, rank FROM expenses_fts WHERE expenses_fts MATCH ?) AS hits
+CROSS JOIN expenses USING (id)
+'''
+
+def init_search_index(conn, schema='main'):
+    conn.execute(f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.expenses_fts USING fts5(
+        description, category,
+        content='expenses', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    ''')
+    conn.execute(f"INSERT INTO {schema}.expenses_fts (expenses_fts, rank) VALUES ('rank', '{SEARCH_RANK}')")
+    add_row = 'INSERT INTO expenses_fts (rowid, description, category) VALUES (NEW.id, NEW.description, NEW.category);'
+    remove_row = '''
+    INSERT INTO expenses_fts (expenses_fts, rowid, description, category)
+    VALUES ('delete', OLD.id, OLD.description, OLD.category);
+    '''
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS {schema}.expenses_fts_insert AFTER INSERT ON expenses BEGIN {add_row} END')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS {schema}.expenses_fts_delete AFTER DELETE ON expenses BEGIN {remove_row} END')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {schema}.expenses_fts_update AFTER UPDATE OF description, category ON expenses
+    BEGIN {remove_row} {add_row} END
+    ''')
+
+def rebuild_search_index(conn, schema='main'):
+    # Re-read every expense into the index, e.g. after editing expenses outside the app
+    conn.execute(f"INSERT INTO {schema}.expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+def search_match_query(text):
+    # Every word the user typed must appear; the last one may be a prefix of a word
+    # still being typed. Quoting each word keeps FTS5 operators and punctuation in
+    # the input from being parsed.
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if terms:
+        terms[-1] += '*'
+    return ' AND '.join(terms) or None
+
+# Archive Partitions
+# Closed years can be moved out of an expense database into read-only yearly
+# archive files under <database>.archive/, so the live database every rerun reads
+# stays small. The rollups keep covering every year, so totals, charts and budgets
+# never open an archive. Listing, search and export run their query against the
+# live table and each archived year their date range touches, and merge the
+# results. Archive files are never modified: a changed year is written to a new
+# file, which archive_partitions switches to in the same transaction that removes
+# the moved rows from the live table. Archives keep the receipts their expenses use.
+# Archives written before v11 have no currency column; their expenses read as
+# rupees, the currency v11 gave every live expense.
+ARCHIVE_COLUMNS = 'id, user_id, date, category, description, amount_paise, receipt_hash, fingerprint, currency'
+ARCHIVE_RECEIPT_COLUMNS = 'hash, data, thumbnail, mime, processed'
+
+def archive_dir(db_file):
+    return os.path.splitext(db_file)[0] + '.archive'
+
+def archive_files(conn, db_file, start_date=None, end_date=None):
+    # Archived years overlapping the date range, newest first
+    rows = conn.execute('''
+    SELECT file FROM archive_partitions WHERE year BETWEEN ? AND ? ORDER BY year DESC
+    ''', (start_date.year if start_date else 0, end_date.year if end_date else 9999))
+    return [os.path.join(archive_dir(db_file), file) for (file,) in rows]
+
+def archive_has_currency(conn, schema='main'):
+    return 'currency' in [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info(expenses)')]
+
+def open_archive(path):
+    # Archive files never change once written, so SQLite can skip locking them
+    conn = sqlite3.connect(sqlite_uri(path, mode='ro', immutable=1), uri=True)
+    if not archive_has_currency(conn):
+        # Unqualified names resolve to temp first, so queries read expenses through this
+        conn.execute("CREATE TEMP VIEW expenses AS SELECT *, 'INR' AS currency FROM main.expenses")
+    return conn
+
+def read_partitions(db_file, read, start_date=None, end_date=None):
+    # read(conn) on the live database, then on each archived year the range touches
+    with db_connection(db_file) as conn:
+        results = [read(conn)]
+        files = archive_files(conn, db_file, start_date, end_date)
+    for path in files:
+        with closing(open_archive(path)) as archive:
+            results.append(read(archive))
+    return results
+
+def read_partitioned_frame(tenant, start_date, end_date, sql, params, order, ascending, limit=None):
+    # The query's rows from every partition in the range, sorted across partitions.
+    # The archived column marks rows that can no longer be changed.
+    import pandas as pd
+    frames = read_partitions(tenant.db_file, lambda conn: pd.read_sql_query(sql, conn, params=params), start_date, end_date)
+    for number, frame in enumerate(frames):
+        frame['archived'] = number > 0
+    df = frames[0]
+    if len(frames) > 1:
+        df = pd.concat([frame for frame in frames if not frame.empty] or frames[:1], ignore_index=True)
+        df = df.sort_values(order, ascending=ascending, ignore_index=True)
+        if limit is not None:
+            df = df.head(limit)
+    return typed_expense_frame(df)
+
+def archived_daily_totals(conn, db_file):
+    # Daily rollup rows for the archived years, for rebuild_rollups
+    totals = []
+    for path in archive_files(conn, db_file):
+        with closing(open_archive(path)) as archive:
+            totals.extend(archive.execute('''
+            SELECT user_id, date, category, currency, SUM(amount_paise), COUNT(*) FROM expenses
+            GROUP BY user_id, date, category, currency
+            '''))
+    return totals
+
+def archived_fingerprints(conn, tenant):
+    # Import fingerprints already taken by the user's archived expenses
+    fingerprints = set()
+    for path in archive_files(conn, tenant.db_file):
+        with closing(open_archive(path)) as archive:
+            fingerprints.update(row[0] for row in archive.execute('''
+            SELECT fingerprint FROM expenses WHERE user_id = ? AND fingerprint IS NOT NULL
+            ''', (tenant.user_id,)))
+    return fingerprints
+
+def add_to_rollups(conn, where, params):
+    # Count the matching live expenses into the rollups a second time, so deleting
+    # them afterwards (which the triggers subtract) leaves the totals as they were
+    for table, key in ROLLUP_TABLES.items():
+        value = 'date' if key == 'date' else 'substr(date, 1, 7)'
+        conn.execute(f'''
+        INSERT INTO {table} (user_id, {key}, category, currency, amount_paise, expense_count)
+        SELECT user_id, {value}, category, currency, SUM(amount_paise), COUNT(*) FROM main.expenses
+        WHERE {where} GROUP BY user_id, {value}, category, currency
+        ON CONFLICT(user_id, {key}, category, currency) DO UPDATE SET
+            amount_paise = amount_paise + excluded.amount_paise,
+            expense_count = expense_count + excluded.expense_count
+        ''', params)
+
+def write_archive(conn, year, old_file, move_live, drop_user_id):
+    # Fills the attached new_archive with the year's rows and their receipts
+    start, end = f'{year:04d}-01-01', f'{year + 1:04d}-01-01'
+    conn.execute('PRAGMA new_archive.journal_mode = DELETE')
+    conn.execute('''
+    CREATE TABLE new_archive.expenses (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        description TEXT,
+        amount_paise INTEGER NOT NULL,
+        receipt_hash TEXT,
+        fingerprint TEXT,
+        currency TEXT NOT NULL
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE new_archive.receipts (
+        hash TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        thumbnail BLOB,
+        mime TEXT,
+        processed INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    sources = []
+    if old_file is not None:
+        sources.append(('old_archive', 'user_id IS NOT ?', (drop_user_id,)))
+    if move_live:
+        sources.append(('main', 'date >= ? AND date < ?', (start, end)))
+    for schema, where, params in sources:
+        columns = ARCHIVE_COLUMNS
+        if not archive_has_currency(conn, schema):
+            columns = columns.replace('currency', "'INR' AS currency")
+        conn.execute(f'''
+        INSERT INTO new_archive.expenses ({ARCHIVE_COLUMNS})
+        SELECT {columns} FROM {schema}.expenses WHERE {where} ORDER BY id
+        ''', params)
+        conn.execute(f'''
+        INSERT OR IGNORE INTO new_archive.receipts ({ARCHIVE_RECEIPT_COLUMNS})
+        SELECT {ARCHIVE_RECEIPT_COLUMNS} FROM {schema}.receipts
+        WHERE hash IN (SELECT receipt_hash FROM new_archive.expenses)
+        ''')
+    # The indexes archives are read through: dashboard filters, import fingerprints, search
+    conn.execute('CREATE INDEX new_archive.idx_expenses_user_date ON expenses (user_id, date)')
+    conn.execute('CREATE INDEX new_archive.idx_expenses_user_category_date ON expenses (user_id, category, date)')
+    conn.execute('CREATE INDEX new_archive.idx_expenses_user_fingerprint ON expenses (user_id, fingerprint)')
+    init_search_index(conn, 'new_archive')
+    rebuild_search_index(conn, 'new_archive')
+    return conn.execute('SELECT COUNT(*) FROM new_archive.expenses').fetchone()[0]
+
+def rewrite_archive(db_file, year, move_live=True, drop_user_id=None):
+    # Writes a new file for the year: what its archive holds now, minus the rows of
+    # drop_user_id, plus the year's live expenses when move_live is set. Then
+    # switches archive_partitions over to it and removes the moved expenses (and the
+    # receipts only they used) from the live database. Returns how many moved.
+    directory = archive_dir(db_file)
+    os.makedirs(directory, exist_ok=True)
+    start, end = f'{year:04d}-01-01', f'{year + 1:04d}-01-01'
+    with db_connection(db_file) as conn:
+        row = conn.execute('SELECT file FROM archive_partitions WHERE year = ?', (year,)).fetchone()
+        old_file = row[0] if row else None
+        new_file = f'{year}.{time.time_ns()}.db'
+        new_path = os.path.join(directory, new_file)
+        # ATTACH and DETACH can't run inside a transaction, so both happen around the
+        # two commits: one for the new file, one for the switch-over
+        conn.execute('ATTACH DATABASE ? AS new_archive', (new_path,))
+        if old_file is not None:
+            conn.execute('ATTACH DATABASE ? AS old_archive', (sqlite_uri(os.path.join(directory, old_file), mode='ro'),))
+        try:
+            count = write_archive(conn, year, old_file, move_live, drop_user_id)
             conn.commit()
-    else: # If DB exists, ensure budget_goals table is there
-        with sqlite3.connect(db_file) as conn:
-            conn.execute('''
-            CREATE TABLE IF NOT EXISTS budget_goals (
-                category TEXT PRIMARY KEY,
-                monthly_limit REAL NOT NULL
-            )
-            ''')
+            conn.execute('BEGIN')
+            moved = 0
+            if move_live:
+                moved_rows = 'date >= ? AND date < ? AND id IN (SELECT id FROM new_archive.expenses)'
+                add_to_rollups(conn, moved_rows, (start, end))
+                moved = conn.execute(f'DELETE FROM main.expenses WHERE {moved_rows}', (start, end)).rowcount
+                conn.execute('''
+                DELETE FROM main.receipts WHERE hash IN (SELECT receipt_hash FROM new_archive.expenses)
+                AND NOT EXISTS (SELECT 1 FROM main.expenses WHERE receipt_hash = receipts.hash)
+                ''')
+            if count:
+                conn.execute('''
+                INSERT OR REPLACE INTO archive_partitions (year, file, expense_count) VALUES (?, ?, ?)
+                ''', (year, new_file, count))
+            else:
+                conn.execute('DELETE FROM archive_partitions WHERE year = ?', (year,))
             conn.commit()
+        except BaseException:
+            conn.rollback()
+            count = 0
+            raise
+        finally:
+            conn.execute('DETACH DATABASE new_archive')
+            if old_file is not None:
+                conn.execute('DETACH DATABASE old_archive')
+            # Only the file archive_partitions now names is kept
+            if not count:
+                os.remove(new_path)
+    if old_file is not None:
+        os.remove(os.path.join(directory, old_file))
+    return moved
+
+def archive_year(db_file, year):
+    # Move the year's live expenses into its archive; returns how many moved
+    return rewrite_archive(db_file, year)
+
+def live_years_before(db_file, year):
+    # Years before the given one that still have expenses in the live database
+    with db_connection(db_file) as conn:
+        return [int(row[0]) for row in conn.execute('''
+        SELECT DISTINCT substr(date, 1, 4) FROM expenses WHERE date < ? ORDER BY 1
+        ''', (f'{year:04d}-01-01',))]
+
+def purge_archived_user(tenant):
+    # Rewrite every archive that still holds rows of the user, without them
+    with db_connection(tenant.db_file) as conn:
+        partitions = conn.execute('SELECT year, file FROM archive_partitions').fetchall()
+    for year, file in partitions:
+        with closing(open_archive(os.path.join(archive_dir(tenant.db_file), file))) as archive:
+            found = archive.execute('SELECT 1 FROM expenses WHERE user_id = ? LIMIT 1', (tenant.user_id,)).fetchone()
+        if found:
+            rewrite_archive(tenant.db_file, year, move_live=False, drop_user_id=tenant.user_id)
+
+def store_receipt(conn, img_bytes):
+    receipt_hash = hashlib.sha256(img_bytes).hexdigest()
+    conn.execute('INSERT OR IGNORE INTO receipts (hash, data) VALUES (?, ?)', (receipt_hash, img_bytes))
+    return receipt_hash
+
+def read_receipt_column(db_file, column, receipt_hash):
+    # Receipts of archived expenses moved into the archive with them
+    with db_connection(db_file) as conn:
+        row = conn.execute(f'SELECT {column} FROM receipts WHERE hash = ?', (receipt_hash,)).fetchone()
+        files = archive_files(conn, db_file) if row is None else []
+    for path in files:
+        with closing(open_archive(path)) as archive:
+            row = archive.execute(f'SELECT {column} FROM receipts WHERE hash = ?', (receipt_hash,)).fetchone()
+        if row is not None:
+            break
+    return row[0] if row else None
+
+@traced('sql')
+@cached_query
+def get_receipt(db_file, receipt_hash):
+    return read_receipt_column(db_file, 'data', receipt_hash)
+
+@traced('sql')
+@cached_query
+def get_receipt_thumbnail(db_file, receipt_hash):
+    # None until the receipt has been processed
+    return read_receipt_column(db_file, 'thumbnail', receipt_hash)
 
-def add_expense(db_file, date, category, description, amount, receipt_photo=None):
-    with sqlite3.connect(db_file) as conn:
+# Receipt Processing
+# Uploads are stored as-is so adding an expense returns immediately. A background
+# thread pool then strips EXIF, downscales and recompresses the image and builds a
+# small thumbnail for the dashboard. Receipts keep the hash of the original upload
+# so identical uploads still deduplicate.
+RECEIPT_MAX_DIMENSION = int(os.environ.get('RECEIPT_MAX_DIMENSION', 1600))
+RECEIPT_QUALITY = int(os.environ.get('RECEIPT_QUALITY', 80))
+RECEIPT_THUMBNAIL_SIZE = (320, 320)
+RECEIPT_WORKERS = 2
+RECEIPT_PREVIEW_CACHE_MAX_ENTRIES = 16
+
+def receipt_format():
+    from PIL import features
+    return ('WEBP', 'image/webp') if features.check('webp') else ('JPEG', 'image/jpeg')
+
+def encode_receipt_image(image, max_size, quality):
+    image = image.copy()
+    image.thumbnail(max_size)
+    fmt, mime = receipt_format()
+    if fmt == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    out = io.BytesIO()
+    # EXIF and other metadata are only written when passed explicitly, so they are dropped here
+    image.save(out, fmt, quality=quality)
+    return out.getvalue(), mime
+
+def make_receipt_thumbnail(img_bytes):
+    from PIL import Image, ImageOps
+    image = Image.open(io.BytesIO(img_bytes))
+    # Let the JPEG decoder skip straight to a reduced scale
+    image.draft('RGB', RECEIPT_THUMBNAIL_SIZE)
+    image = ImageOps.exif_transpose(image)
+    return encode_receipt_image(image, RECEIPT_THUMBNAIL_SIZE, RECEIPT_QUALITY)[0]
+
+@st.cache_resource
+def get_receipt_preview_cache():
+    return QueryCache(max_entries=RECEIPT_PREVIEW_CACHE_MAX_ENTRIES)
+
+def receipt_preview(img_bytes):
+    # The add form reruns on every keystroke with the same upload attached, so its
+    # thumbnail is kept by the hash of the uploaded bytes
+    digest = hashlib.sha256(img_bytes).hexdigest()
+    return get_receipt_preview_cache().get_or_load(digest, None, lambda: make_receipt_thumbnail(img_bytes))
+
+def process_receipt_image(img_bytes):
+    from PIL import Image, ImageOps
+    image = Image.open(io.BytesIO(img_bytes))
+    # Apply the camera orientation before the EXIF that carries it is stripped
+    image = ImageOps.exif_transpose(image)
+    data, mime = encode_receipt_image(image, (RECEIPT_MAX_DIMENSION, RECEIPT_MAX_DIMENSION), RECEIPT_QUALITY)
+    thumbnail, _ = encode_receipt_image(image, RECEIPT_THUMBNAIL_SIZE, RECEIPT_QUALITY)
+    return data, thumbnail, mime
+
+@traced('sql')
+def process_receipt(db_file, receipt_hash):
+    with db_connection(db_file) as conn:
+        row = conn.execute('SELECT data FROM receipts WHERE hash = ? AND processed = 0', (receipt_hash,)).fetchone()
+    if row is None:
+        return False
+    # Image work happens outside the connection lock so other sessions are not held up
+    try:
+        data, thumbnail, mime = process_receipt_image(row[0])
+    except Exception:
+        # Not an image Pillow can read; keep the upload as it is and stop retrying
+        data, thumbnail, mime = row[0], None, None
+    with db_connection(db_file) as conn:
         conn.execute('''
-        INSERT INTO expenses (date, category, description, amount, receipt_photo)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (date, category, description, amount, receipt_photo))
-        conn.commit()
+        UPDATE receipts SET data = ?, thumbnail = ?, mime = ?, processed = 1
+        WHERE hash = ? AND processed = 0
+        ''', (data, thumbnail, mime, receipt_hash))
+    return True
 
-def get_expenses(db_file):
-    with sqlite3.connect(db_file) as conn:
-        df = pd.read_sql_query('SELECT * FROM expenses ORDER BY date DESC', conn)
-    return df
+def process_pending_receipts(db_file):
+    with db_connection(db_file) as conn:
+        hashes = [row[0] for row in conn.execute('SELECT hash FROM receipts WHERE processed = 0')]
+    return sum(process_receipt(db_file, receipt_hash) for receipt_hash in hashes)
 
-def delete_expense(db_file, expense_id):
-    with sqlite3.connect(db_file) as conn:
-        conn.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
-        conn.commit()
+@st.cache_resource
+def get_receipt_executor():
+    return ThreadPoolExecutor(max_workers=RECEIPT_WORKERS, thread_name_prefix='receipt')
+
+def schedule_receipt_processing(db_file, receipt_hash):
+    return get_receipt_executor().submit(process_receipt, db_file, receipt_hash)
 
-def set_budget_goal(db_file, category, monthly_limit):
-    with sqlite3.connect(db_file) as conn:
+def process_receipt_when_committed(db_file, future):
+    # Done callback for add_expense: the receipt row only exists once the write commits
+    if future.exception() is None and future.result() is not None:
+        schedule_receipt_processing(db_file, future.result())
+
+# The write helpers below return a Future from the write queue; call .result() to
+# wait for the commit (and to see any error) before reading the change back.
+def add_expense(tenant, date, category, description, amount_paise, receipt_photo=None, currency=HOME_CURRENCY):
+    def write(conn):
+        receipt_hash = store_receipt(conn, receipt_photo) if receipt_photo is not None else None
         conn.execute('''
-        INSERT INTO budget_goals (category, monthly_limit)
-        VALUES (?, ?)
-        ON CONFLICT(category) DO UPDATE SET monthly_limit = excluded.monthly_limit
-        ''', (category, monthly_limit))
-        conn.commit()
+        INSERT INTO expenses (user_id, date, category, description, amount_paise, receipt_hash, currency)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (tenant.user_id, date, category, description, amount_paise, receipt_hash, currency))
+        return receipt_hash
+    future = submit_write(tenant, write)
+    if receipt_photo is not None:
+        future.add_done_callback(functools.partial(process_receipt_when_committed, tenant.db_file))
+    return future
+
+# Number of rows shown per page in the dashboard expense table
+EXPENSES_PAGE_SIZE = 25
+
+def expense_filters(tenant, start_date=None, end_date=None, category=None):
+    # Build a parameterised WHERE clause for the dashboard filters
+    clauses, params = ['user_id = ?'], [tenant.user_id]
+    if start_date is not None:
+        clauses.append('date >= ?')
+        params.append(start_date.isoformat())
+    if end_date is not None:
+        clauses.append('date <= ?')
+        params.append(end_date.isoformat())
+    if category is not None and category != 'All':
+        clauses.append('category = ?')
+        params.append(category)
+    return clauses, params
+
+@traced('sql')
+@cached_query
+def get_expenses(tenant, start_date=None, end_date=None, category=None):
+    clauses, params = expense_filters(tenant, start_date, end_date, category)
+    where = f"WHERE {' AND '.join(clauses)}"
+    return read_partitioned_frame(tenant, start_date, end_date, f'''
+    SELECT id, date, category, description, amount_paise, currency, receipt_hash
+    FROM expenses {where}
+    ORDER BY date DESC, id DESC
+    ''', params, ['date', 'id'], ascending=False)
+
+@traced('sql')
+@cached_query
+def get_expense_bounds(tenant):
+    # Date range and categories for the dashboard filter defaults. The rollups
+    # cover archived years too, so this never opens an archive.
+    with db_connection(*tenant) as conn:
+        min_date, max_date = conn.execute('SELECT MIN(date), MAX(date) FROM daily_totals WHERE user_id = ?', (tenant.user_id,)).fetchone()
+        categories = [row[0] for row in conn.execute('''
+        SELECT DISTINCT category FROM monthly_totals WHERE user_id = ? ORDER BY category
+        ''', (tenant.user_id,))]
+    if min_date is None:
+        return None
+    return date.fromisoformat(min_date), date.fromisoformat(max_date), categories
+
+@traced('sql')
+@cached_query
+def get_expense_page(tenant, start_date=None, end_date=None, category=None, cursor=None, page_size=EXPENSES_PAGE_SIZE):
+    # Keyset pagination on (date, id): the cursor is the last row of the previous page
+    clauses, params = expense_filters(tenant, start_date, end_date, category)
+    if cursor is not None:
+        clauses.append('(date, id) < (?, ?)')
+        params.extend(cursor)
+    where = f"WHERE {' AND '.join(clauses)}"
+    df = read_partitioned_frame(tenant, start_date, end_date, f'''
+    SELECT id, date, category, description, amount_paise, currency, receipt_hash
+    FROM expenses {where}
+    ORDER BY date DESC, id DESC
+    LIMIT ?
+    ''', params + [page_size + 1], ['date', 'id'], ascending=False, limit=page_size + 1)
+    # One extra row tells us whether there is a next page without a COUNT query
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        next_cursor = (df['date'].iloc[-1].strftime('%Y-%m-%d'), int(df['id'].iloc[-1]))
+    return df, next_cursor
+
+@traced('sql')
+@cached_query
+def get_expense_summary(tenant, start_date=None, end_date=None, category=None):
+    clauses, params = expense_filters(tenant, start_date, end_date, category)
+    where = f"WHERE {' AND '.join(clauses)}"
+    with db_connection(*tenant) as conn:
+        count, total = conn.execute(f'''
+        SELECT COALESCE(SUM(expense_count), 0), COALESCE(SUM(CASE WHEN currency = ? THEN amount_paise END), 0)
+        FROM daily_totals {where}
+        ''', [HOME_CURRENCY] + params).fetchone()
+        foreign = conn.execute(f'''
+        SELECT date, currency, SUM(amount_paise) FROM daily_totals {where} AND currency != ?
+        GROUP BY date, currency
+        ''', params + [HOME_CURRENCY]).fetchall()
+    if foreign:
+        import pandas as pd
+        df = typed_expense_frame(pd.DataFrame(foreign, columns=['date', 'currency', 'amount_paise']))
+        total += int(home_amounts(df, get_fx_rates(tenant.db_file)).sum())
+    return count, total
+
+@traced('sql')
+@cached_query
+def search_expense_page(tenant, search, start_date=None, end_date=None, category=None, cursor=None, page_size=EXPENSES_PAGE_SIZE):
+    # Keyset pagination like get_expense_page. The cursor is (rank, id) of the last
+    # row, with rank None when the results are listed newest first.
+    match = search_match_query(search)
+    clauses, params = expense_filters(tenant, start_date, end_date, category)
+    if cursor is None:
+        with db_connection(tenant.db_file) as conn:
+            ranked = not archive_files(conn, tenant.db_file, start_date, end_date) and conn.execute('''
+            SELECT COUNT(*) FROM (SELECT 1 FROM expenses_fts WHERE expenses_fts MATCH ? LIMIT ?)
+            ''', (match, SEARCH_RANK_LIMIT + 1)).fetchone()[0] <= SEARCH_RANK_LIMIT
+    else:
+        ranked = cursor[0] is not None
+    if ranked:
+        rank, order, sort, ascending = 'hits.rank', 'hits.rank, id', ['rank', 'id'], True
+        if cursor is not None:
+            clauses.append('(hits.rank, id) > (?, ?)')
+            params.extend(cursor)
+    else:
+        # Left unread, the rank is never computed
+        rank, order, sort, ascending = 'NULL', 'id DESC', ['id'], False
+        if cursor is not None:
+            clauses.append('id < ?')
+            params.append(cursor[1])
+    where = f"WHERE {' AND '.join(clauses)}"
+    df = read_partitioned_frame(tenant, start_date, end_date, f'''
+    SELECT id, date, category, description, amount_paise, currency, receipt_hash, {rank} AS rank
+    FROM {SEARCH_HITS}
+    {where}
+    ORDER BY {order}
+    LIMIT ?
+    ''', [match] + params + [page_size + 1], sort, ascending, limit=page_size + 1)
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        next_cursor = (float(df['rank'].iloc[-1]) if ranked else None, int(df['id'].iloc[-1]))
+    return df.drop(columns='rank'), next_cursor
+
+@traced('sql')
+@cached_query
+def get_search_summary(tenant, search, start_date=None, end_date=None, category=None):
+    # Count and home-currency total of the matches. Past SEARCH_RANK_LIMIT matches
+    # the count stops at SEARCH_RANK_LIMIT + 1 and the total is None.
+    clauses, params = expense_filters(tenant, start_date, end_date, category)
+    where = f"WHERE {' AND '.join(clauses)}"
+    import pandas as pd
+    frames = read_partitions(tenant.db_file, lambda conn: pd.read_sql_query(f'''
+    SELECT {FOREIGN_DATE} AS date, currency, COUNT(*) AS expense_count, SUM(amount_paise) AS amount_paise
+    FROM (SELECT date, currency, amount_paise FROM {SEARCH_HITS} {where} LIMIT ?)
+    GROUP BY 1, 2
+    ''', conn, params=[HOME_CURRENCY, search_match_query(search)] + params + [SEARCH_RANK_LIMIT + 1]), start_date, end_date)
+    df = typed_expense_frame(pd.concat(frames, ignore_index=True))
+    count = int(df['expense_count'].sum())
+    if count > SEARCH_RANK_LIMIT:
+        return SEARCH_RANK_LIMIT + 1, None
+    return count, int(home_amounts(df, get_fx_rates(tenant.db_file)).sum())
+
+def delete_expense(tenant, expense_id):
+    def write(conn):
+        row = conn.execute('SELECT receipt_hash FROM expenses WHERE id = ? AND user_id = ?', (expense_id, tenant.user_id)).fetchone()
+        deleted = conn.execute('DELETE FROM expenses WHERE id = ? AND user_id = ?', (expense_id, tenant.user_id)).rowcount
+        # Drop the receipt once no other expense points at it
+        if row and row[0] is not None:
+            conn.execute('''
+            DELETE FROM receipts WHERE hash = ?
+            AND NOT EXISTS (SELECT 1 FROM expenses WHERE receipt_hash = ?)
+            ''', (row[0], row[0]))
+        return deleted
+    # The future resolves to the number of expenses deleted (0 or 1)
+    return submit_write(tenant, write)
 
-def get_budget_goals(db_file):
-    with sqlite3.connect(db_file) as conn:
-        df = pd.read_sql_query('SELECT * FROM budget_goals', conn)
+def set_budget_goal(tenant, category, monthly_limit_paise):
+    def write(conn):
+        conn.execute('''
+        INSERT INTO budget_goals (user_id, category, monthly_limit_paise)
+        VALUES (?, ?, ?)
+        ON CONFLICT(user_id, category) DO UPDATE SET monthly_limit_paise = excluded.monthly_limit_paise
+        ''', (tenant.user_id, category, monthly_limit_paise))
+    return submit_write(tenant, write)
+
+@traced('sql')
+@cached_query
+def get_budget_goals(tenant):
+    with db_connection(*tenant) as conn:
+        df = read_expense_frame(conn, '''
+        SELECT category, monthly_limit_paise FROM budget_goals WHERE user_id = ?
+        ''', [tenant.user_id])
     return df
 
-def delete_budget_goal(db_file, category):
-    with sqlite3.connect(db_file) as conn:
-        conn.execute('DELETE FROM budget_goals WHERE category = ?', (category,))
-        conn.commit()
+def delete_budget_goal(tenant, category):
+    def write(conn):
+        conn.execute('DELETE FROM budget_goals WHERE user_id = ? AND category = ?', (tenant.user_id, category))
+    return submit_write(tenant, write)
 
+@traced('sql')
 def delete_user_account(username):
     try:
+        # Look the user's expenses up before the user row that identifies them is gone
+        storage = get_storage()
+        tenant = storage.tenant(username)
+
         # Connect to the users database
-        conn = sqlite3.connect('users.db')
-        conn.execute('DELETE FROM users WHERE username = ?', (username,))
-        conn.commit()
-        conn.close()
+        with db_connection(USER_DB) as conn:
+            conn.execute('DELETE FROM users WHERE username = ?', (username,))
+            conn.execute('DELETE FROM api_tokens WHERE username = ?', (username,))
+            conn.commit()
 
-        # Delete the user's expense database file
-        user_db_file = f'expenses_{username}.db'
-        if os.path.exists(user_db_file):
-            os.remove(user_db_file)
+        if tenant is not None:
+            storage.delete(tenant)
 
         return True
     except Exception as e:
         return False
 
-# Main app
-def main():
+# Charts
+# Chart specs and images are cached by a hash of the aggregated data they show, so a
+# rerun with unchanged inputs reuses the previous render. The default backend is a
+# native Vega-Lite chart; matplotlib is only loaded when EXPENSE_CHART_BACKEND=matplotlib.
+CHART_BACKEND = os.environ.get('EXPENSE_CHART_BACKEND', 'vega')
+CHART_CACHE_MAX_ENTRIES = 128
+CHART_COLORS = [GRUVOX_DARK[name] for name in ('orange', 'aqua', 'yellow', 'blue', 'purple', 'green', 'red', 'gray')]
+
+def daily_spending(totals_df):
+    # Daily totals in paise across categories, with zero-spend days filled in
+    daily = totals_df.groupby('date')['amount_paise'].sum()
+    return daily.asfreq('D', fill_value=0)
+
+def category_breakdown(totals_df):
+    # Totals in paise for the categories that have spending
+    return totals_df.groupby('category', observed=True)['amount_paise'].sum()
+
+@st.cache_resource
+def get_chart_cache():
+    return QueryCache(max_entries=CHART_CACHE_MAX_ENTRIES)
+
+def cached_chart(kind, series, render):
+    import pandas as pd
+    digest = hashlib.sha1(pd.util.hash_pandas_object(series).values.tobytes()).hexdigest()
+    return get_chart_cache().get_or_load((kind, digest), None, lambda: render(series))
+
+def spending_over_time_spec(daily, anomalies):
+    # Unusual days (spending_anomalies of daily) are marked with a point on top of the line
+    unusual = set(anomalies.index)
+    return {
+        'width': 'container',
+        'data': {'values': [{'date': day.strftime('%Y-%m-%d'), 'amount': amount / 100, 'unusual': day in unusual}
+                            for day, amount in daily.items()]},
+        'encoding': {
+            'x': {'field': 'date', 'type': 'temporal', 'title': None},
+            'y': {'field': 'amount', 'type': 'quantitative', 'title': f'Amount ({currency_symbol().strip()})'},
+        },
+        'layer': [
+            {'mark': {'type': 'line', 'color': GRUVOX_DARK['orange'], 'tooltip': True}},
+            {'transform': [{'filter': 'datum.unusual'}],
+             'mark': {'type': 'point', 'filled': True, 'size': 60, 'color': GRUVOX_DARK['red'], 'tooltip': True}},
+        ],
+    }
+
+def category_breakdown_spec(breakdown):
+    return {
+        'width': 'container',
+        'data': {'values': [{'category': category, 'amount': amount / 100} for category, amount in breakdown.items()]},
+        'transform': [
+            {'joinaggregate': [{'op': 'sum', 'field': 'amount', 'as': 'total'}]},
+            {'calculate': 'datum.amount / datum.total', 'as': 'share'},
+        ],
+        'encoding': {
+            'theta': {'field': 'amount', 'type': 'quantitative', 'stack': True},
+            'color': {'field': 'category', 'type': 'nominal', 'scale': {'range': CHART_COLORS}},
+            'tooltip': [
+                {'field': 'category', 'type': 'nominal'},
+                {'field': 'amount', 'type': 'quantitative', 'format': ',.2f'},
+                {'field': 'share', 'type': 'quantitative', 'format': '.1%'},
+            ],
+        },
+        'layer': [
+            {'mark': {'type': 'arc', 'outerRadius': 120}},
+            {'mark': {'type': 'text', 'radius': 145, 'color': GRUVOX_DARK['fg']},
+             'encoding': {'text': {'field': 'share', 'type': 'quantitative', 'format': '.1%'}}},
+        ],
+    }
+
+def draw_category_breakdown(ax, breakdown):
+    ax.pie(breakdown, labels=breakdown.index, autopct='%1.1f%%', colors=CHART_COLORS)
+    ax.set_title('Category Breakdown')
+
+def draw_spending_over_time(ax, daily):
+    ax.plot(daily.index, daily.to_numpy() / 100, color=GRUVOX_DARK['orange'])
+    ax.set_ylabel(f'Amount ({currency_symbol().strip()})')
+    ax.set_title('Spending Over Time')
+    ax.tick_params(axis='x', labelrotation=45)
+
+def chart_png(draw, data):
+    # A standalone Figure is never registered with pyplot, so nothing accumulates in
+    # the server process; it is still cleared explicitly once the PNG is written
+    from matplotlib.figure import Figure
+    fig = Figure()
+    try:
+        draw(fig.subplots(), data)
+        out = io.BytesIO()
+        fig.savefig(out, format='png', bbox_inches='tight')
+        return out.getvalue()
+    finally:
+        fig.clear()
+
+def category_breakdown_png(breakdown):
+    return chart_png(draw_category_breakdown, breakdown)
+
+@traced('render')
+def render_spending_over_time(daily, anomalies):
+    st.vega_lite_chart(cached_chart('daily', daily, lambda daily: spending_over_time_spec(daily, anomalies)))
+
+@traced('render')
+def render_category_breakdown(breakdown):
+    if CHART_BACKEND == 'matplotlib':
+        st.image(cached_chart('breakdown_png', breakdown, category_breakdown_png))
+    else:
+        st.vega_lite_chart(cached_chart('breakdown', breakdown, category_breakdown_spec))
+
+# Forecasting
+# End-of-month projections for the budget warnings and unusual days for the
+# spending chart. Both work on NumPy arrays built from the daily rollups, so the
+# cost grows with days x categories rather than with the number of expenses.
+FORECAST_MONTHS = 6  # past months the end-of-month projection learns from
+FORECAST_DECAY = 0.5  # weight of each past month relative to the month after it
+ANOMALY_WINDOW = 28  # trailing days an unusual day is compared against
+ANOMALY_THRESHOLD = 3.5  # robust z-score above which a day counts as unusual
+ANOMALY_MIN_ACTIVE_DAYS = 7  # days with spending the trailing window needs before a day is scored
+
+def month_start(day, months_back=0):
+    # First day of the month months_back months before day's month
+    month = day.year * 12 + day.month - 1 - months_back
+    return date(month // 12, month % 12 + 1, 1)
+
+def daily_matrix(totals_df, start, end):
+    # Paise per day (rows, start..end) and category (columns, the frame's categories)
+    import numpy as np
+    categories = totals_df['category'].cat.categories
+    days = (end - start).days + 1
+    day_index = (totals_df['date'].to_numpy().astype('datetime64[D]') - np.datetime64(start, 'D')).astype(np.int64)
+    keep = (day_index >= 0) & (day_index < days)
+    cells = day_index[keep] * len(categories) + totals_df['category'].cat.codes.to_numpy()[keep]
+    matrix = np.bincount(cells, weights=totals_df['amount_paise'].to_numpy()[keep], minlength=days * len(categories))
+    return matrix.astype(np.int64).reshape(days, len(categories)), categories
+
+def forecast_month_end(totals_df, today):
+    # Projected spend per category at the end of today's month: what is spent so far
+    # plus what the rest of the month added in each of the last FORECAST_MONTHS
+    # months, weighting each month FORECAST_DECAY times the month after it. Looking
+    # at the same days of the month keeps a bill paid once a month from being
+    # projected a second time. totals_df needs rows from month_start(today, FORECAST_MONTHS).
+    import numpy as np
+    import pandas as pd
+    history_start = month_start(today, FORECAST_MONTHS)
+    matrix, categories = daily_matrix(totals_df, history_start, today)
+    # cumulative[i] is the spend of the first i days
+    cumulative = np.vstack([np.zeros((1, len(categories)), dtype=np.int64), matrix.cumsum(axis=0)])
+
+    starts = [(month_start(today, k) - history_start).days for k in range(FORECAST_MONTHS, -1, -1)]
+    ends = np.array(starts[1:])
+    cutoffs = np.array([start + min(today.day, end - start) for start, end in zip(starts, starts[1:])])
+    remainders = cumulative[ends] - cumulative[cutoffs]
+    spent = cumulative[-1] - cumulative[starts[-1]]
+
+    # Months that ended before the first recorded expense say nothing about spending
+    active_days = np.flatnonzero(matrix.any(axis=1))
+    first_day = active_days[0] if len(active_days) else len(matrix)
+    weights = FORECAST_DECAY ** np.arange(FORECAST_MONTHS - 1, -1, -1) * (ends > first_day)
+    if weights.sum() > 0:
+        expected = weights @ remainders / weights.sum()
+    else:
+        # No earlier month to learn from yet: carry this month's daily rate forward
+        days_left = (month_start(today, -1) - today).days - 1
+        expected = spent / today.day * days_left
+    return pd.Series(spent + np.rint(expected).astype(np.int64), index=categories)
+
+def sorted_median(rows):
+    # Median of each row of an array sorted along its rows; a sort is several times
+    # faster than np.median(axis=1) on many short rows
+    width = rows.shape[1]
+    return (rows[:, (width - 1) // 2] + rows[:, width // 2]) / 2
+
+def spending_anomalies(daily):
+    # Days whose spend is far above the trailing ANOMALY_WINDOW days, scored against
+    # the rolling median and median absolute deviation (MAD) so one big day does
+    # not hide the next. Returns the day's amount and the typical (median) amount.
+    import numpy as np
+    import pandas as pd
+    values = daily.to_numpy(dtype=np.float64)
+    if len(values) <= ANOMALY_WINDOW:
+        return pd.DataFrame({'amount_paise': daily.iloc[:0], 'typical_paise': daily.iloc[:0]})
+    windows = np.lib.stride_tricks.sliding_window_view(values[:-1], ANOMALY_WINDOW)
+    current = values[ANOMALY_WINDOW:]
+    median = sorted_median(np.sort(windows, axis=1))
+    deviations = np.abs(windows - median[:, None])
+    mad = sorted_median(np.sort(deviations, axis=1))
+    # Most days have no spending at all, which leaves the MAD at zero; fall back to
+    # the mean absolute deviation then (both scaled to a normal standard deviation)
+    scale = np.where(mad > 0, 1.4826 * mad, 1.2533 * deviations.mean(axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = (current - median) / scale
+    # A window with little spending in it (the start of the history, or after a
+    # break) says too little about what is usual
+    active = np.count_nonzero(windows, axis=1) >= ANOMALY_MIN_ACTIVE_DAYS
+    flagged = np.flatnonzero(active & (scale > 0) & (score > ANOMALY_THRESHOLD))
+    return pd.DataFrame({
+        'amount_paise': daily.iloc[flagged + ANOMALY_WINDOW],
+        'typical_paise': np.rint(median[flagged]).astype(np.int64),
+    })
+
+@traced('sql')
+@cached_query
+def get_spending_anomalies(tenant, start_date=None, end_date=None, category=None):
+    # Unusual days under the dashboard filters, for both the chart and the list below it
+    return spending_anomalies(daily_spending(get_daily_totals(tenant, start_date, end_date, category)))
+
+# Data Export
+# Exports are only built when the download button is clicked. Rows are streamed
+# from a read-only connection in chunks and written straight to the output, so no
+# frame of every expense is ever built. export_expenses writes to a spooled temp
+# file for callers that can stream it on; the download button needs the finished
+# file as bytes (Streamlit keeps the payload in memory), which export_download gives it.
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024  # bytes kept in memory before spilling to disk
+# amount is in the expense's currency, followed by the amount converted to the home currency
+HOME_AMOUNT_COLUMN = f'amount_{HOME_CURRENCY.lower()}'
+EXPORT_COLUMNS = ['id', 'date', 'category', 'description', 'amount', 'currency', HOME_AMOUNT_COLUMN]
+EXPORT_SELECT = 'id, date, category, description, amount_paise, currency'  # amounts are exported in rupees
+EXPORT_FORMATS = {
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+def available_export_formats():
+    # Parquet needs pyarrow, which is optional
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return [fmt for fmt in EXPORT_FORMATS if fmt != 'Parquet']
+    return list(EXPORT_FORMATS)
+
+def iter_expense_chunks(tenant, start_date=None, end_date=None, category=None, include_receipts=False, chunk_size=EXPORT_CHUNK_SIZE):
+    # Receipt images are large blobs and are left out unless explicitly requested
+    clauses, params = expense_filters(tenant, start_date, end_date, category)
+    where = f"WHERE {' AND '.join(clauses)}"
+    select = EXPORT_SELECT
+    if include_receipts:
+        select += ', (SELECT data FROM receipts WHERE hash = receipt_hash)'
+    # Separate read-only connections so a long export never holds the pooled one
+    with db_connection(tenant.db_file) as conn:
+        files = archive_files(conn, tenant.db_file, start_date, end_date)
+    conns = [sqlite3.connect(sqlite_uri(tenant.db_file, mode='ro'), uri=True)] + [open_archive(path) for path in files]
+    try:
+        cursors = [conn.execute(f'''
+        SELECT {select} FROM expenses {where}
+        ORDER BY date DESC, id DESC
+        ''', params) for conn in conns]
+        # Each partition is already sorted, so merging them keeps the stream in order
+        rows = cursors[0] if len(cursors) == 1 else heapq.merge(*cursors, key=lambda row: (row[1], row[0]), reverse=True)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        for conn in conns:
+            conn.close()
+
+def with_home_amounts(rows, rates):
+    # Inserts the home-currency amount after the currency column, converting the
+    # whole chunk with one as-of join
+    import pandas as pd
+    df = pd.DataFrame({
+        'date': pd.to_datetime([row[1] for row in rows], format='%Y-%m-%d'),
+        'amount_paise': [row[4] for row in rows],
+        'currency': [row[5] for row in rows],
+    })
+    return [row[:6] + (int(amount),) + row[6:] for row, amount in zip(rows, home_amounts(df, rates))]
+
+def text_export_row(row):
+    # Spreadsheet formats get exact rupee amounts and receipt images as base64 text
+    row = list(row)
+    row[4] = to_rupees(row[4])
+    row[6] = to_rupees(row[6])
+    if len(row) > len(EXPORT_COLUMNS):
+        receipt = row[-1]
+        row[-1] = base64.b64encode(receipt).decode() if receipt is not None else None
+    return row
+
+def write_csv_export(chunks, columns, out):
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(text_export_row(row) for row in rows)
+    text.flush()
+    text.detach()
+
+def write_excel_export(chunks, columns, out):
+    from openpyxl import Workbook
+    # Write-only mode streams rows to disk instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Expenses')
+    sheet.append(columns)
+    for rows in chunks:
+        for row in rows:
+            row = text_export_row(row)
+            row[1] = date.fromisoformat(row[1])
+            sheet.append(row)
+    workbook.save(out)
+
+def write_parquet_export(chunks, columns, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    fields = [
+        ('id', pa.int64()), ('date', pa.date32()), ('category', pa.string()),
+        ('description', pa.string()), ('amount', pa.decimal128(14, 2)), ('currency', pa.string()),
+        (HOME_AMOUNT_COLUMN, pa.decimal128(14, 2)), ('receipt', pa.binary()),
+    ]
+    schema = pa.schema(fields[:len(columns)])
+    with pq.ParquetWriter(out, schema, compression='zstd') as writer:
+        for rows in chunks:
+            batch = {name: [row[i] for row in rows] for i, name in enumerate(schema.names)}
+            batch['date'] = [date.fromisoformat(value) for value in batch['date']]
+            for name in ('amount', HOME_AMOUNT_COLUMN):
+                batch[name] = [to_rupees(value) for value in batch[name]]
+            writer.write_table(pa.table(batch, schema=schema))
+
+EXPORT_WRITERS = {
+    'Excel': write_excel_export,
+    'CSV': write_csv_export,
+    'Parquet': write_parquet_export,
+}
+
+@traced('sql')
+def export_expenses(tenant, fmt, start_date=None, end_date=None, category=None, include_receipts=False):
+    columns = EXPORT_COLUMNS + (['receipt'] if include_receipts else [])
+    rates = get_fx_rates(tenant.db_file)
+    chunks = (with_home_amounts(rows, rates) for rows in iter_expense_chunks(tenant, start_date, end_date, category, include_receipts))
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    EXPORT_WRITERS[fmt](chunks, columns, out)
+    out.seek(0)
+    return out
+
+def export_download(tenant, fmt, start_date=None, end_date=None, category=None, include_receipts=False):
+    with export_expenses(tenant, fmt, start_date, end_date, category, include_receipts) as out:
+        return out.read()
+
+# Monthly Reports
+# Statements built without the UI by `manage.py reports`: for one user and month, a
+# workbook (summary, daily spending and every expense) or a one-page PDF, plus the
+# dashboard's two charts as PNG files. The figures come from the same rollup reads
+# and helpers as the dashboard tab. A report is written to a temporary directory
+# and renamed into place once complete, so a directory that exists is finished.
+REPORT_FORMATS = ['xlsx', 'pdf']
+
+def month_report(tenant, month):
+    # None when the user spent nothing that month
+    import pandas as pd
+    first, end = month_start(month), month_start(month, -1)
+    last = end - timedelta(days=1)
+    count, total = get_expense_summary(tenant, first, last)
+    if count == 0:
+        return None
+    totals_df = get_daily_totals(tenant, first, last)
+    spent = category_breakdown(totals_df)
+    budgets = get_budget_goals(tenant).set_index('category')['monthly_limit_paise']
+    categories = spent.index.union(budgets.index, sort=False)
+    return {
+        'month': first,
+        'count': count,
+        'total': total,
+        'daily': daily_spending(totals_df).reindex(pd.date_range(first, last), fill_value=0),
+        'breakdown': spent,
+        'categories': pd.DataFrame({
+            'spent': spent.reindex(categories, fill_value=0),
+            'budget': budgets.reindex(categories),
+        }),
+    }
+
+def report_category_rows(report):
+    # (category, spent, budget, share of budget used) with amounts in paise
+    for category, row in report['categories'].iterrows():
+        budget = None if row['budget'] != row['budget'] else int(row['budget'])  # NaN: no budget
+        used = row['spent'] / budget if budget else None
+        yield str(category), int(row['spent']), budget, used
+
+def write_report_xlsx(report, tenant, path, images):
+    from openpyxl import Workbook
+    from openpyxl.drawing.image import Image
+    workbook = Workbook()
+    summary = workbook.active
+    summary.title = 'Summary'
+    summary.append(['Month', report['month'].strftime('%B %Y')])
+    summary.append(['Expenses', report['count']])
+    summary.append([f'Total ({HOME_CURRENCY})', to_rupees(report['total'])])
+    summary.append([])
+    summary.append(['Category', f'Spent ({HOME_CURRENCY})', f'Budget ({HOME_CURRENCY})', 'Budget used'])
+    for category, spent, budget, used in report_category_rows(report):
+        summary.append([category, to_rupees(spent), to_rupees(budget) if budget is not None else None, used])
+        summary.cell(summary.max_row, 4).number_format = '0%'
+    for anchor, image in zip(('F1', 'F22'), images):
+        summary.add_image(Image(image), anchor)
+
+    daily = workbook.create_sheet('Daily')
+    daily.append(['Date', f'Spent ({HOME_CURRENCY})'])
+    for day, amount in report['daily'].items():
+        daily.append([day.date(), to_rupees(amount)])
+
+    expenses = workbook.create_sheet('Expenses')
+    expenses.append(EXPORT_COLUMNS)
+    month_end = month_start(report['month'], -1) - timedelta(days=1)
+    rates = get_fx_rates(tenant.db_file)
+    for rows in iter_expense_chunks(tenant, report['month'], month_end):
+        for row in with_home_amounts(rows, rates):
+            row = text_export_row(row)
+            row[1] = date.fromisoformat(row[1])
+            expenses.append(row)
+    workbook.save(path)
+
+def write_report_pdf(report, tenant, path, images):
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(8.27, 11.69))  # A4
+    try:
+        fig.suptitle(f"Expenses for {report['month']:%B %Y}")
+        fig.text(0.08, 0.93, f"{report['count']} expenses · Total {format_money(report['total'])}")
+        table, breakdown, daily = fig.subplots(3, 1, gridspec_kw={'height_ratios': [1, 2, 2]})
+        table.axis('off')
+        rows = [
+            [category, format_money(spent), format_money(budget) if budget is not None else '–',
+             f'{used:.0%}' if used is not None else '–']
+            for category, spent, budget, used in report_category_rows(report)
+        ]
+        table.table(cellText=rows, colLabels=['Category', 'Spent', 'Budget', 'Budget used'], loc='center')
+        draw_category_breakdown(breakdown, report['breakdown'])
+        draw_spending_over_time(daily, report['daily'])
+        fig.tight_layout(rect=(0, 0, 1, 0.92))
+        with PdfPages(path) as pdf:
+            pdf.savefig(fig)
+    finally:
+        fig.clear()
+
+REPORT_WRITERS = {
+    'xlsx': write_report_xlsx,
+    'pdf': write_report_pdf,
+}
+
+def report_dir(out_dir, month, username):
+    return os.path.join(out_dir, month.strftime('%Y-%m'), username)
+
+def write_month_report(tenant, username, month, fmt, out_dir):
+    # Writes report.<fmt>, spending.png and categories.png under
+    # <out_dir>/<YYYY-MM>/<username>/. Returns False when there was nothing to report.
+    report = month_report(tenant, month)
+    if report is None:
+        return False
+    final = report_dir(out_dir, month, username)
+    partial = f'{final}.partial-{os.getpid()}'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    try:
+        images = []
+        for name, draw, data in (('categories.png', draw_category_breakdown, report['breakdown']),
+                                 ('spending.png', draw_spending_over_time, report['daily'])):
+            images.append(os.path.join(partial, name))
+            with open(images[-1], 'wb') as f:
+                f.write(chart_png(draw, data))
+        REPORT_WRITERS[fmt](report, tenant, os.path.join(partial, f'report.{fmt}'), images)
+        shutil.rmtree(final, ignore_errors=True)
+        os.rename(partial, final)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    return True
+
+# Backups
+# Online snapshots of every database, taken with SQLite's backup API while the app
+# keeps running. Each database is copied BACKUP_PAGES_PER_STEP pages at a time from
+# its own connection, which holds one read transaction for the whole copy: the
+# result is a consistent snapshot, WAL writers never wait on it, and the pause
+# between steps keeps its I/O from crowding out the app. A run writes
+# <backup dir>/<UTC time>/ with a gzip file for each database that changed since the
+# previous run and a manifest naming the newest copy of every database, so
+# restoring to any point in time only needs the newest manifest before it.
+# Copies are stored flat under backup_file_name(), as database paths may be
+# absolute or point outside the app directory.
+BACKUP_DIR = os.environ.get('EXPENSE_BACKUP_DIR', 'backups')
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_PAUSE = 0.005  # seconds between steps
+BACKUP_TIME_FORMAT = '%Y%m%dT%H%M%SZ'
+
+def backup_sources():
+    # Every database the app keeps, as paths relative to the app directory
+    live = [path for path in (USER_DB, SHARED_DB) if os.path.exists(path)]
+    live += sorted(name for name in os.listdir('.') if name.startswith('expenses_') and name.endswith('.db'))
+    sources = []
+    for db_file in live:
+        sources.append(db_file)
+        if os.path.isdir(archive_dir(db_file)):
+            sources += sorted(os.path.join(archive_dir(db_file), name)
+                              for name in os.listdir(archive_dir(db_file)) if name.endswith('.db'))
+    return sources
+
+def backup_file_name(db_file):
+    # The hash of the full path keeps same-named databases from different
+    # directories apart
+    digest = hashlib.sha1(db_file.encode()).hexdigest()[:8]
+    return f'{os.path.basename(db_file)}-{digest}.gz'
+
+def file_signature(db_file):
+    # Changes whenever a commit reaches the database or its WAL. An empty or missing
+    # WAL counts the same, as opening and closing a connection creates and removes one.
+    signature = []
+    for path in (db_file, f'{db_file}-wal'):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if stat.st_size:
+            signature += [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+def list_backups(backup_dir=BACKUP_DIR):
+    # Finished snapshots, oldest first
+    if not os.path.isdir(backup_dir):
+        return []
+    return sorted(name for name in os.listdir(backup_dir)
+                  if os.path.exists(os.path.join(backup_dir, name, 'manifest.json')))
+
+def read_backup_manifest(backup_dir, snapshot):
+    with open(os.path.join(backup_dir, snapshot, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+def backup_database(db_file, out_path, pages=BACKUP_PAGES_PER_STEP, pause=BACKUP_STEP_PAUSE):
+    # Copies db_file into the gzip file out_path. Returns timing stats and the
+    # signature the copy matches, or None for the signature when something
+    # committed during the copy (the next run then copies the database again).
+    src = sqlite3.connect(db_file)
+    copy_path = f'{out_path}.tmp'
+    dst = sqlite3.connect(copy_path)
+    steps = []
+    started = time.perf_counter()
+    try:
+        src.execute('BEGIN')
+        src.execute('SELECT count(*) FROM sqlite_master').fetchone()  # starts the read transaction
+        data_version = src.execute('PRAGMA data_version').fetchone()[0]
+        step_started = time.perf_counter()
+
+        def progress(status, remaining, total):
+            nonlocal step_started
+            steps.append(time.perf_counter() - step_started)
+            time.sleep(pause)
+            step_started = time.perf_counter()
+
+        src.backup(dst, pages=pages, progress=progress)
+        src.execute('COMMIT')
+        signature = file_signature(db_file)
+        if src.execute('PRAGMA data_version').fetchone()[0] != data_version:
+            signature = None
+        copied = time.perf_counter() - started
+    finally:
+        src.close()
+        dst.close()
+    try:
+        with open(copy_path, 'rb') as raw, gzip.open(out_path, 'wb', compresslevel=6) as out:
+            shutil.copyfileobj(raw, out, 1024 * 1024)
+        size = os.path.getsize(copy_path)
+    finally:
+        os.remove(copy_path)
+    return {
+        'signature': signature,
+        'bytes': size,
+        'compressed_bytes': os.path.getsize(out_path),
+        'copy_seconds': copied,
+        'seconds': time.perf_counter() - started,
+        'steps': len(steps),
+        'longest_step_seconds': max(steps, default=0),
+    }
+
+def backup_all(backup_dir=BACKUP_DIR, force=False):
+    # Backs up every database that changed since the newest snapshot. Returns the
+    # new snapshot's name (None when nothing changed) and per-database stats.
+    snapshots = list_backups(backup_dir)
+    previous = read_backup_manifest(backup_dir, snapshots[-1])['databases'] if snapshots else {}
+    sources = backup_sources()
+    changed = {db_file for db_file in sources
+               if force or db_file not in previous or previous[db_file]['signature'] != file_signature(db_file)}
+    if not changed:
+        return None, {}
+    snapshot = time.strftime(BACKUP_TIME_FORMAT, time.gmtime())
+    if snapshots and snapshot <= snapshots[-1]:
+        time.sleep(1)  # snapshot names have one-second resolution
+        snapshot = time.strftime(BACKUP_TIME_FORMAT, time.gmtime())
+    partial = os.path.join(backup_dir, f'{snapshot}.partial')
+    databases, stats = {}, {}
+    try:
+        os.makedirs(partial, exist_ok=True)
+        for db_file in sources:
+            if db_file not in changed:
+                databases[db_file] = previous[db_file]
+                continue
+            name = backup_file_name(db_file)
+            stats[db_file] = backup_database(db_file, os.path.join(partial, name))
+            databases[db_file] = {'snapshot': snapshot, 'file': name, 'signature': stats[db_file]['signature']}
+        with open(os.path.join(partial, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'databases': databases}, f, indent=1)
+        os.rename(partial, os.path.join(backup_dir, snapshot))
+    finally:
+        shutil.rmtree(partial, ignore_errors=True)
+    return snapshot, stats
+
+def restore_backup(at=None, names=None, backup_dir=BACKUP_DIR):
+    # Restores the databases as of the newest snapshot taken at or before at (a
+    # naive UTC datetime; default the newest snapshot), or only the given ones.
+    # The app must be stopped. Databases created after the snapshot are left alone.
+    snapshots = list_backups(backup_dir)
+    if at is not None:
+        snapshots = [name for name in snapshots if name <= at.strftime(BACKUP_TIME_FORMAT)]
+    if not snapshots:
+        raise ValueError('No backup was taken before that time')
+    snapshot = snapshots[-1]
+    databases = read_backup_manifest(backup_dir, snapshot)['databases']
+    unknown = set(names or ()) - set(databases)
+    if unknown:
+        raise ValueError(f"Not in backup {snapshot}: {', '.join(sorted(unknown))}")
+    for db_file in names or databases:
+        get_connection_pool().close(db_file)
+        os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+        entry = databases[db_file]
+        restored = f'{db_file}.restore'
+        # Snapshots from before backup_file_name() mirrored the relative path
+        copy_path = os.path.join(backup_dir, entry['snapshot'], entry.get('file', f'{db_file}.gz'))
+        with gzip.open(copy_path, 'rb') as f, \
+                open(restored, 'wb') as out:
+            shutil.copyfileobj(f, out, 1024 * 1024)
+        for path in (f'{db_file}-wal', f'{db_file}-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        os.replace(restored, db_file)
+    return snapshot, list(names or databases)
+
+# Statement Import
+# Bank and credit-card statements (CSV, QIF, OFX) are parsed row by row and
+# inserted with executemany in a single transaction. Every row gets a fingerprint
+# of its date, amount, description and how often that combination already
+# appeared in the file, so re-importing skips rows through the unique index
+# while genuine repeats inside one statement are kept. A statement's own category
+# is kept when it names one of EXPENSE_CATEGORIES; other rows get the default.
+EXPENSE_CATEGORIES = ['Food', 'Transport', 'Utilities', 'Entertainment', 'Health', 'Other']
+IMPORT_BATCH_SIZE = 5000
+IMPORT_DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d %b %Y', '%Y%m%d', '%m/%d/%y', '%d/%m/%y']
+
+def known_category(value):
+    # The EXPENSE_CATEGORIES entry value names, ignoring case and surrounding space,
+    # or None. Imports and the API both store only these, like the forms do.
+    folded = (value or '').strip().casefold()
+    return next((category for category in EXPENSE_CATEGORIES if category.casefold() == folded), None)
+
+def parse_statement_date(value, date_format=None):
+    value = value.strip().replace("'", '/')
+    formats = [date_format] if date_format else IMPORT_DATE_FORMATS
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date '{value}'")
+
+def fits_date_format(value, fmt):
+    # %Y also reads two digits, so 01/02/24 would otherwise fit the four-digit formats as year 24
+    try:
+        return datetime.strptime(value.strip().replace("'", '/'), fmt).year >= 1900
+    except ValueError:
+        return False
+
+def detect_date_formats(values):
+    # The formats that read every date in a statement, in IMPORT_DATE_FORMATS order.
+    # More than one means the file is ambiguous (every day is 12 or less, so it
+    # reads day-first and month-first alike); none means no date could be read.
+    # Dates no remaining format reads are left for the import to report.
+    candidates, matched = IMPORT_DATE_FORMATS, False
+    for value in values:
+        fits = [fmt for fmt in candidates if fits_date_format(value, fmt)]
+        if fits:
+            candidates, matched = fits, True
+            if len(candidates) == 1:
+                break
+    return candidates if matched else []
+
+def parse_statement_amount(value):
+    # Returns whole paise, parsed from the text so no float rounding creeps in
+    text = value.strip().replace(',', '').replace('₹', '').replace('$', '').replace(' ', '')
+    negative = text.startswith('(') and text.endswith(')')
+    try:
+        paise = to_paise(Decimal(text[1:-1] if negative else text))
+    except InvalidOperation:
+        raise ValueError(f"Unrecognised amount '{value}'") from None
+    return -paise if negative else paise
+
+def guess_statement_column(header, keywords, default=0):
+    for i, column in enumerate(header):
+        if any(keyword in column.lower() for keyword in keywords):
+            return i
+    return default
+
+def read_csv_statement(stream, date_column, description_column, amount_column, category_column=None):
+    for record in csv.DictReader(stream):
+        yield {
+            'date': record.get(date_column) or '',
+            'description': record.get(description_column) or '',
+            'amount': record.get(amount_column) or '',
+            'category': record.get(category_column) if category_column else None,
+        }
+
+def read_qif_statement(stream):
+    record = {}
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        code, value = line[0], line[1:]
+        if code == '^':
+            if record:
+                yield record
+            record = {}
+        elif code == 'D':
+            record['date'] = value
+        elif code in 'TU':
+            record['amount'] = value
+        elif code == 'P':
+            record['description'] = value
+        elif code == 'M':
+            record.setdefault('description', value)
+        elif code == 'L':
+            record['category'] = value
+    if record:
+        yield record
+
+OFX_TAG = re.compile(r'<(/?)(\w+)>([^<\r\n]*)')
+
+def read_ofx_statement(stream):
+    # Handles both SGML (unclosed tags, one per line) and XML flavoured OFX
+    record = None
+    for line in stream:
+        for is_close, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if is_close and record is not None:
+                    yield record
+                    record = None
+                elif not is_close:
+                    record = {}
+            elif record is not None and not is_close:
+                value = value.strip()
+                if tag == 'DTPOSTED':
+                    record['date'] = value[:8]
+                elif tag == 'TRNAMT':
+                    record['amount'] = value
+                elif tag == 'NAME' or (tag == 'MEMO' and not record.get('description')):
+                    record['description'] = value
+
+def import_fingerprint(expense_date, amount_paise, description, occurrence):
+    key = f'{expense_date.isoformat()}|{format_rupees(amount_paise)}|{description}|{occurrence}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def normalize_statement(records, default_category, negative_is_expense=True, date_format=None):
+    # Yields (row, error): row is ready to insert, or None when the record is skipped
+    seen = {}
+    for record in records:
+        try:
+            expense_date = parse_statement_date(record.get('date', ''), date_format)
+            amount = parse_statement_amount(record.get('amount', ''))
+        except ValueError as e:
+            yield None, str(e)
+            continue
+        # Credits (refunds, salary) are not expenses
+        if (amount < 0) != negative_is_expense or amount == 0:
+            yield None, None
+            continue
+        amount = abs(amount)
+        description = (record.get('description') or '').strip()
+        category = known_category(record.get('category')) or default_category
+        key = (expense_date, amount, description)
+        seen[key] = occurrence = seen.get(key, 0) + 1
+        yield (expense_date.isoformat(), category, description, amount,
+               import_fingerprint(expense_date, amount, description, occurrence)), None
+
+@traced('sql')
+def import_expenses(tenant, rows, batch_size=IMPORT_BATCH_SIZE, progress=None, currency=HOME_CURRENCY):
+    # Rows are parsed without holding the connection, which is only taken while a
+    # batch is inserted, so other sessions' reads and writes interleave with a long
+    # import. Bulk batches skip the write queue: its per-write savepoints make SQLite
+    # journal every index page a 5000-row insert touches.
+    summary = {'imported': 0, 'duplicates': 0, 'skipped': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        with db_connection(*tenant) as conn:
+            cursor = conn.executemany('''
+            INSERT OR IGNORE INTO expenses (user_id, date, category, description, amount_paise, fingerprint, currency)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(tenant.user_id,) + row + (currency,) for row in batch])
+        summary['imported'] += cursor.rowcount
+        summary['duplicates'] += len(batch) - cursor.rowcount
+        batch.clear()
+        if progress is not None:
+            progress(summary)
+
+    with db_connection(*tenant) as conn:
+        # The live table's unique index can't see archived years, so rows already
+        # imported into one are counted as duplicates here
+        archived = archived_fingerprints(conn, tenant)
+    for row, error in rows:
+        if row is not None and row[-1] in archived:
+            summary['duplicates'] += 1
+            continue
+        if row is None:
+            summary['skipped'] += 1
+            if error is not None and len(summary['errors']) < 20:
+                summary['errors'].append(error)
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return summary
+
+STATEMENT_READERS = {
+    'qif': read_qif_statement,
+    'ofx': read_ofx_statement,
+    'qfx': read_ofx_statement,
+}
+
+# Theme
+@st.cache_resource
+def theme_css():
+    # Built once per process instead of on every rerun
     # Apply dark mode theme directly
     current_theme_colors = GRUVOX_DARK
 
-    # Inject CSS for dark mode only
     css = f"""
     <style>
       /* Base styles */
@@ -295,7 +2649,437 @@ def main():
       }}
     </style>
     """
-    st.markdown(css, unsafe_allow_html=True)
+    return css
+
+# Views
+# The logged-in app is split into views and only the selected one runs on a rerun.
+# Data more than one view needs is read through a per-rerun snapshot that loads
+# each value the first time it is asked for.
+class ExpenseSnapshot:
+    def __init__(self, username, tenant):
+        self.username = username
+        self.tenant = tenant
+
+    @functools.cached_property
+    def bounds(self):
+        return get_expense_bounds(self.tenant)
+
+    @functools.cached_property
+    def expense_count(self):
+        return get_expense_summary(self.tenant)[0]
+
+    @functools.cached_property
+    def budget_goals(self):
+        return get_budget_goals(self.tenant)
+
+    @functools.cached_property
+    def month_totals(self):
+        return get_month_totals(self.tenant, date.today())
+
+    @functools.cached_property
+    def spending_forecast(self):
+        today = date.today()
+        totals_df = get_daily_totals(self.tenant, month_start(today, FORECAST_MONTHS), today)
+        return forecast_month_end(totals_df, today)
+
+def expense_currencies(tenant):
+    # The home currency first, then the ones there are rates for and the common ones
+    rated, _ = get_fx_currencies(tenant)
+    return [HOME_CURRENCY] + sorted((set(rated) | set(CURRENCY_SYMBOLS)) - {HOME_CURRENCY})
+
+def warn_missing_rates(tenant):
+    _, missing = get_fx_currencies(tenant)
+    if missing:
+        st.warning(f"No exchange rates for {', '.join(missing)}, so those expenses count as zero in totals. "
+                   "Import rates with `python manage.py import-fx-rates rates.csv`.")
+
+def render_add_view(snapshot):
+    tenant = snapshot.tenant
+    d = st.date_input('Date', date.today())
+    cat = st.selectbox('Category', EXPENSE_CATEGORIES)
+    desc = st.text_input('Description')
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        amt = st.number_input('Amount', min_value=0.0, step=100.0, format='%.2f')
+    with col2:
+        currency = st.selectbox('Currency', expense_currencies(tenant))
+    
+    # Receipt photo upload
+    st.write("📷 **Receipt Photo (Optional)**")
+    uploaded_file = st.file_uploader("Upload receipt image", type=['png', 'jpg', 'jpeg'], help="Upload a photo of your receipt for record keeping")
+    
+    # Show a small preview if image is uploaded
+    if uploaded_file is not None:
+        st.image(receipt_preview(uploaded_file.getvalue()), caption="Receipt Preview", width=300)
+    
+    if st.button('Add Expense'):
+        # Process uploaded image
+        receipt_data = None
+        if uploaded_file is not None:
+            # Raw image bytes go to the receipt store
+            receipt_data = uploaded_file.getvalue()
+        
+        add_expense(tenant, d.isoformat(), cat, desc, to_paise(amt), receipt_data, currency).result()
+        st.success('Expense added successfully!')
+        if uploaded_file is not None:
+            st.success('Receipt photo saved! 📸')
+
+def render_import_view(snapshot):
+    tenant = snapshot.tenant
+    st.write("Import transactions from a bank or credit card statement (CSV, QIF or OFX).")
+    statement = st.file_uploader("Upload statement", type=['csv', 'qif', 'ofx', 'qfx'], key="statement_file")
+    if statement is not None:
+        extension = statement.name.rsplit('.', 1)[-1].lower()
+        stream = io.TextIOWrapper(statement, encoding='utf-8-sig', errors='replace', newline='')
+        read_statement = STATEMENT_READERS.get(extension)
+        if extension == 'csv':
+            # Map the statement's columns onto date / description / amount / category
+            header = next(csv.reader([statement.readline().decode('utf-8-sig', errors='replace')]), [])
+            statement.seek(0)
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                date_column = st.selectbox("Date column", header, index=guess_statement_column(header, ['date']))
+            with col2:
+                description_column = st.selectbox("Description column", header, index=guess_statement_column(header, ['desc', 'narration', 'payee', 'details', 'memo']))
+            with col3:
+                amount_column = st.selectbox("Amount column", header, index=guess_statement_column(header, ['amount', 'debit', 'withdrawal']))
+            with col4:
+                category_column = st.selectbox("Category column", ['(none)'] + header, index=guess_statement_column(header, ['category'], -1) + 1)
+            read_statement = functools.partial(read_csv_statement, date_column=date_column,
+                                               description_column=description_column, amount_column=amount_column,
+                                               category_column=None if category_column == '(none)' else category_column)
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            default_category = st.selectbox("Category for uncategorised rows", EXPENSE_CATEGORIES, index=len(EXPENSE_CATEGORIES) - 1)
+        with col2:
+            date_format = st.selectbox("Date format", ['Auto'] + IMPORT_DATE_FORMATS)
+        with col3:
+            sign = st.selectbox("Expenses are", ["Negative amounts", "Positive amounts"])
+        with col4:
+            currency = st.selectbox("Statement currency", expense_currencies(tenant))
+
+        if st.button("Import Statement"):
+            if date_format == 'Auto':
+                # One format for the whole file, so a US statement is not read day-first
+                formats = detect_date_formats(record.get('date', '') for record in read_statement(stream))
+                stream.seek(0)
+                if len(formats) > 1:
+                    st.warning("The dates in this statement read the same way in more than one format "
+                               f"({', '.join(formats)}). Choose the Date format and import again.")
+                    return
+                date_format = formats[0] if formats else 'Auto'
+            progress_bar = st.progress(0.0, text="Importing...")
+            total_size = max(statement.size, 1)
+
+            def show_progress(summary):
+                done = min(statement.tell() / total_size, 1.0)
+                progress_bar.progress(done, text=f"Imported {summary['imported']} expenses...")
+
+            rows = normalize_statement(read_statement(stream), default_category, sign == "Negative amounts",
+                                       None if date_format == 'Auto' else date_format)
+            summary = import_expenses(tenant, rows, progress=show_progress, currency=currency)
+            progress_bar.progress(1.0, text="Import finished")
+            st.success(f"Imported {summary['imported']} expenses. "
+                       f"Skipped {summary['duplicates']} already imported and {summary['skipped']} other rows.")
+            if summary['errors']:
+                st.warning("Some rows could not be read:\n\n" + "\n\n".join(summary['errors']))
+
+def render_dashboard_view(snapshot):
+    tenant = snapshot.tenant
+    bounds = snapshot.bounds
+    if bounds is None:
+        st.info('No expenses recorded yet.')
+    else:
+        min_date, max_date, categories = bounds
+
+        # Filtering options
+        st.subheader("Filter Expenses")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            start_date = st.date_input("From Date", value=min_date)
+        with col2:
+            end_date = st.date_input("To Date", value=max_date)
+        with col3:
+            available_categories = ['All'] + categories
+            selected_category = st.selectbox("Category", available_categories)
+        search = st.text_input("Search", placeholder="Search descriptions and categories").strip()
+        warn_missing_rates(tenant)
+        
+        # Apply filters in SQL, through the search index when there is a search
+        if search:
+            total_count, total_amount = get_search_summary(tenant, search, start_date, end_date, selected_category)
+        else:
+            total_count, total_amount = get_expense_summary(tenant, start_date, end_date, selected_category)
+
+        if total_count == 0:
+            filter_msg = f"No expenses found between {start_date} and {end_date}"
+            if selected_category != 'All':
+                filter_msg += f" for category '{selected_category}'"
+            if search:
+                filter_msg += f" matching '{search}'"
+            st.warning(filter_msg)
+        else:
+            # Display filterable data table with delete option
+            st.subheader('All Expenses')
+
+            # Reset to the first page whenever the filters change
+            page_filters = (start_date, end_date, selected_category, search)
+            if st.session_state.get('expense_page_filters') != page_filters:
+                st.session_state.expense_page_filters = page_filters
+                st.session_state.expense_page_cursors = [None]
+            page_cursors = st.session_state.expense_page_cursors
+            if search:
+                page_df, next_cursor = search_expense_page(tenant, search, start_date, end_date, selected_category, cursor=page_cursors[-1])
+            else:
+                page_df, next_cursor = get_expense_page(tenant, start_date, end_date, selected_category, cursor=page_cursors[-1])
+            if page_df.empty and len(page_cursors) > 1:
+                # The last rows of this page were deleted, step back a page
+                page_cursors.pop()
+                st.rerun()
+
+            first_row = (len(page_cursors) - 1) * EXPENSES_PAGE_SIZE + 1
+            last_row = first_row + len(page_df) - 1
+            noun = 'matches' if search else 'expenses'
+            if total_amount is None:
+                st.caption(f"Showing {first_row}–{last_row} of more than {SEARCH_RANK_LIMIT:,} {noun}")
+            else:
+                st.caption(f"Showing {first_row}–{last_row} of {total_count} {noun} · Total {format_money(total_amount)}")
+
+            # Add column headers
+            header_cols = st.columns([0.15, 0.2, 0.25, 0.18, 0.12, 0.1])
+            with header_cols[0]:
+                st.write("**Date**")
+            with header_cols[1]:
+                st.write("**Category**")
+            with header_cols[2]:
+                st.write("**Description**")
+            with header_cols[3]:
+                st.write("**Amount**")
+            with header_cols[4]:
+                st.write("**Receipt**")
+            with header_cols[5]:
+                st.write("**Actions**")
+            
+            st.divider()
+            
+            with st.container():
+                for i, row in page_df.iterrows():
+                    # Main expense row
+                    cols = st.columns([0.15, 0.2, 0.25, 0.18, 0.12, 0.1])
+                    with cols[0]:
+                        st.write(row['date'].strftime('%Y-%m-%d'))
+                    with cols[1]:
+                        st.write(row['category'])
+                    with cols[2]:
+                        st.write(row['description'])
+                    with cols[3]:
+                        st.write(f"{format_money(row['amount_paise'], row['currency'])}")
+                    with cols[4]:
+                        # Receipt photo button
+                        has_receipt = isinstance(row['receipt_hash'], str)
+                        if has_receipt:
+                            if st.button("📷", key=f"view_{row['id']}", help="View receipt"):
+                                st.session_state[f"show_receipt_{row['id']}"] = not st.session_state.get(f"show_receipt_{row['id']}", False)
+                        else:
+                            st.write("📋")  # No receipt indicator
+                    with cols[5]:
+                        if row['archived']:
+                            st.button("🗑️", key=f"del_{row['id']}", disabled=True, help="Archived years are read-only")
+                        elif st.button("🗑️", key=f"del_{row['id']}", help="Delete expense"):
+                            delete_expense(tenant, row['id']).result()
+                            st.success("Expense deleted!")
+                            st.rerun()
+                    
+                    # Show receipt image if button was clicked
+                    if has_receipt and st.session_state.get(f"show_receipt_{row['id']}", False):
+                        try:
+                            # Show the thumbnail first; the full image is only loaded on request
+                            full_key = f"full_receipt_{row['id']}"
+                            thumbnail = get_receipt_thumbnail(tenant.db_file, row['receipt_hash'])
+                            if thumbnail is None:
+                                # Not processed yet, e.g. uploaded before the pipeline existed
+                                schedule_receipt_processing(tenant.db_file, row['receipt_hash'])
+                            if thumbnail is not None and not st.session_state.get(full_key, False):
+                                st.image(thumbnail, caption=f"Receipt for {row['description']}")
+                                if st.button("Show full size", key=f"full_btn_{row['id']}"):
+                                    st.session_state[full_key] = True
+                                    st.rerun()
+                            else:
+                                img_data = get_receipt(tenant.db_file, row['receipt_hash'])
+                                st.image(img_data, caption=f"Receipt for {row['description']}", width=400)
+                        except Exception as e:
+                            st.error(f"Error loading receipt image: {str(e)}")
+                    
+                    st.divider()  # Add separator between expenses
+
+            # Page navigation
+            nav_prev, nav_next = st.columns(2)
+            with nav_prev:
+                if st.button("◀ Previous", disabled=len(page_cursors) == 1):
+                    page_cursors.pop()
+                    st.rerun()
+            with nav_next:
+                if st.button("Next ▶", disabled=next_cursor is None):
+                    page_cursors.append(next_cursor)
+                    st.rerun()
+         
+            # Charts
+            st.subheader('Spending Over Time')
+            totals_df = get_daily_totals(tenant, start_date, end_date, selected_category)
+            daily = daily_spending(totals_df)
+            anomalies = get_spending_anomalies(tenant, start_date, end_date, selected_category)
+            render_spending_over_time(daily, anomalies)
+            unusual = anomalies.tail(5)
+            if not unusual.empty:
+                st.caption("Unusual days: " + " · ".join(
+                    f"{day:%d %b %Y} {format_money(row['amount_paise'])} (typical {format_money(row['typical_paise'])})"
+                    for day, row in unusual.iloc[::-1].iterrows()))
+
+            st.subheader('Category Breakdown')
+            render_category_breakdown(category_breakdown(totals_df))
+            
+            # Download data, built only when the button is clicked
+            col1, col2 = st.columns(2)
+            with col1:
+                export_format = st.selectbox("Export format", available_export_formats())
+            with col2:
+                include_receipts = st.checkbox("Include receipt images", value=False)
+            extension, mime = EXPORT_FORMATS[export_format]
+            st.download_button(
+                label=f'Download data as {export_format}',
+                data=functools.partial(export_download, tenant, export_format, start_date, end_date, selected_category, include_receipts),
+                file_name=f'expenses_{snapshot.username}_{start_date}_{end_date}.{extension}',
+                mime=mime
+            )
+
+def render_budget_view(snapshot):
+    tenant = snapshot.tenant
+    budget_df = snapshot.budget_goals
+    
+    st.subheader("Set Monthly Budget Goals")
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        budget_cat = st.selectbox("Category", EXPENSE_CATEGORIES, key="budget_cat")
+    with col2:
+        cat_limit = st.number_input(f"Monthly Limit ({currency_symbol().strip()})", min_value=0.0, step=100.0, format="%.2f", key="budget_amt")
+    with col3:
+        if st.button("Set Budget"):
+            set_budget_goal(tenant, budget_cat, to_paise(cat_limit)).result()
+            st.success(f"Budget goal set for {budget_cat}")
+            st.rerun()
+    
+    if not budget_df.empty:
+        st.subheader("Current Budget Goals")
+        # Create a container for budget goals
+        with st.container():
+            for _, budget_row in budget_df.iterrows():
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    st.write(f"**{budget_row['category']}**: {format_money(budget_row['monthly_limit_paise'])}")
+                with col2:
+                    if st.button("🗑️", key=f"del_budget_{budget_row['category']}", help=f"Remove budget for {budget_row['category']}"):
+                        delete_budget_goal(tenant, budget_row['category']).result()
+                        st.success(f"Budget for {budget_row['category']} removed!")
+                        st.rerun()
+
+        if budget_df.empty:
+            st.info("No budget goals set yet.")
+    
+    if snapshot.expense_count > 0:
+        # Current month's spending by category
+        month_totals = snapshot.month_totals
+        
+        if not budget_df.empty:
+            st.subheader("Budget Progress (Current Month)")
+            warn_missing_rates(tenant)
+            spent = month_totals.groupby('category', observed=True)['amount_paise'].sum()
+            projected = snapshot.spending_forecast
+            for _, budget_row in budget_df.iterrows():
+                cat = budget_row['category']
+                limit = budget_row['monthly_limit_paise']
+                
+                # Find actual spending
+                cat_total = int(spent.get(cat, 0))
+                
+                # Calculate percentage
+                percentage = min((cat_total / limit) * 100, 100) if limit > 0 else 0
+                
+                # Determine color based on percentage
+                if percentage >= 100:
+                    color = "#ff4b4b"  # Red for over budget
+                    status_emoji = "🔴"
+                elif percentage >= 80:
+                    color = "#ffa500"  # Orange/Yellow for warning
+                    status_emoji = "🟡"
+                else:
+                    color = "#00ff00"  # Green for safe
+                    status_emoji = "🟢"
+                
+                # Display category info with status emoji
+                st.write(f"{status_emoji} **{cat}**: {format_money(cat_total)} of {format_money(limit)} ({percentage:.1f}%)")
+                
+                # Custom colored progress bar using HTML
+                progress_html = f"""
+                <div style="background-color: #e0e0e0; border-radius: 10px; padding: 2px; margin: 5px 0;">
+                    <div style="background-color: {color}; width: {min(percentage, 100)}%; height: 20px; border-radius: 8px; 
+                                display: flex; align-items: center; justify-content: center; color: white; font-weight: bold; font-size: 12px;">
+                        {percentage:.1f}%
+                    </div>
+                </div>
+                """
+                st.markdown(progress_html, unsafe_allow_html=True)
+                
+                # Status messages
+                cat_projected = int(projected.get(cat, cat_total))
+                if cat_total > limit:
+                    st.error(f"⚠️ Over budget by {format_money(cat_total - limit)} in {cat}")
+                elif cat_projected > limit:
+                    st.warning(f"📈 Projected to exceed {cat} budget by {format_money(cat_projected - limit)} "
+                               f"({format_money(cat_projected)} by month end)")
+                elif percentage > 80:
+                    st.warning(f"💡 You've used {percentage:.1f}% of your {cat} budget")
+                elif percentage > 0:
+                    st.success(f"✅ {cat} spending is on track!")
+    else:
+        st.info("No expenses recorded yet. Add some expenses to see budget progress.")
+
+def render_delete_account_view(snapshot):
+    st.write("## Delete Account")
+    st.warning("This action is irreversible. All your data will be permanently deleted.")
+    if st.button("Delete My Account"):
+        # Logic to delete user account and associated data
+        delete_user_account(snapshot.username)
+        st.session_state.authenticated = False
+        st.session_state.username = ''
+        st.success("Your account has been deleted successfully.")
+
+# View label -> (trace span name, render function)
+VIEWS = {
+    "Add New Expense": ('tab_add', render_add_view),
+    "Import Statement": ('tab_import', render_import_view),
+    "View Dashboard": ('tab_dashboard', render_dashboard_view),
+    "Budget Management": ('tab_budget', render_budget_view),
+    "Delete Account": ('tab_delete_account', render_delete_account_view),
+}
+
+# Main app
+def main():
+    debug = DEBUG_PANEL_ENABLED and st.query_params.get('debug') == '1'
+    if not (TRACE_ENABLED or debug):
+        render_app()
+        return
+    start_trace(st.session_state.get('username') or 'anonymous')
+    try:
+        render_app()
+    finally:
+        trace = finish_trace()
+    if debug:
+        render_debug_panel(trace)
+
+def render_app():
+    # Inject CSS for dark mode only
+    st.markdown(theme_css(), unsafe_allow_html=True)
 
     # Initialize user DB and session state
     init_user_db()
@@ -358,253 +3142,20 @@ def main():
         st.success("Logged out")
         return
 
-    # Per-user DB setup
+    # Open the user's expense storage
     username = st.session_state.username
-    db_file = f"expenses_{username}.db"
-    init_db(db_file)
+    tenant = get_storage().open(username)
+    if tenant is None:
+        st.error("User not found")
+        return
 
-    tab_add, tab_dashboard, tab_budget, tab_delete_account = st.tabs(["Add New Expense", "View Dashboard", "Budget Management", "Delete Account"])
-    
-    with tab_add:
-        d = st.date_input('Date', date.today())
-        cat = st.selectbox('Category', ['Food', 'Transport', 'Utilities', 'Entertainment', 'Health', 'Other'])
-        desc = st.text_input('Description')
-        amt = st.number_input('Amount', min_value=0.0, step=100.0, format='%.2f')
-        
-        # Receipt photo upload
-        st.write("📷 **Receipt Photo (Optional)**")
-        uploaded_file = st.file_uploader("Upload receipt image", type=['png', 'jpg', 'jpeg'], help="Upload a photo of your receipt for record keeping")
-        
-        # Show preview if image is uploaded
-        if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Receipt Preview", width=300)
-        
-        if st.button('Add Expense'):
-            # Process uploaded image
-            receipt_data = None
-            if uploaded_file is not None:
-                # Convert image to bytes for storage
-                img_bytes = uploaded_file.getvalue()
-                receipt_data = base64.b64encode(img_bytes).decode()
-            
-            add_expense(db_file, d.isoformat(), cat, desc, amt, receipt_data)
-            st.success('Expense added successfully!')
-            if uploaded_file is not None:
-                st.success('Receipt photo saved! 📸')
-
-    with tab_dashboard:
-        df = get_expenses(db_file)
-        if df.empty:
-            st.info('No expenses recorded yet.')
-        else:
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # Filtering options
-            st.subheader("Filter Expenses")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                start_date = st.date_input("From Date", value=df['date'].min().date())
-            with col2:
-                end_date = st.date_input("To Date", value=df['date'].max().date())
-            with col3:
-                available_categories = ['All'] + list(df['category'].unique())
-                selected_category = st.selectbox("Category", available_categories)
-            
-            # Apply filters
-            mask = (df['date'].dt.date >= start_date) & (df['date'].dt.date <= end_date)
-            if selected_category != 'All':
-                mask = mask & (df['category'] == selected_category)
-            filtered_df = df.loc[mask].copy()
-            
-            if filtered_df.empty:
-                filter_msg = f"No expenses found between {start_date} and {end_date}"
-                if selected_category != 'All':
-                    filter_msg += f" for category '{selected_category}'"
-                st.warning(filter_msg)
-            else:
-                # Display filterable data table with delete option
-                st.subheader('All Expenses')
-                
-                # Add column headers
-                header_cols = st.columns([0.15, 0.2, 0.25, 0.18, 0.12, 0.1])
-                with header_cols[0]:
-                    st.write("**Date**")
-                with header_cols[1]:
-                    st.write("**Category**")
-                with header_cols[2]:
-                    st.write("**Description**")
-                with header_cols[3]:
-                    st.write("**Amount**")
-                with header_cols[4]:
-                    st.write("**Receipt**")
-                with header_cols[5]:
-                    st.write("**Actions**")
-                
-                st.divider()
-                
-                with st.container():
-                    for i, row in filtered_df.iterrows():
-                        # Main expense row
-                        cols = st.columns([0.15, 0.2, 0.25, 0.18, 0.12, 0.1])
-                        with cols[0]:
-                            st.write(row['date'].strftime('%Y-%m-%d'))
-                        with cols[1]:
-                            st.write(row['category'])
-                        with cols[2]:
-                            st.write(row['description'])
-                        with cols[3]:
-                            st.write(f"₹{row['amount']:.2f}")
-                        with cols[4]:
-                            # Receipt photo button
-                            has_receipt = row.get('receipt_photo') is not None
-                            if has_receipt:
-                                if st.button("📷", key=f"view_{row['id']}", help="View receipt"):
-                                    st.session_state[f"show_receipt_{row['id']}"] = not st.session_state.get(f"show_receipt_{row['id']}", False)
-                            else:
-                                st.write("📋")  # No receipt indicator
-                        with cols[5]:
-                            if st.button("🗑️", key=f"del_{row['id']}", help="Delete expense"):
-                                delete_expense(db_file, row['id'])
-                                st.success("Expense deleted!")
-                                st.rerun()
-                        
-                        # Show receipt image if button was clicked
-                        if has_receipt and st.session_state.get(f"show_receipt_{row['id']}", False):
-                            try:
-                                # Decode base64 image
-                                img_data = base64.b64decode(row['receipt_photo'])
-                                image = Image.open(io.BytesIO(img_data))
-                                st.image(image, caption=f"Receipt for {row['description']}", width=400)
-                            except Exception as e:
-                                st.error(f"Error loading receipt image: {str(e)}")
-                        
-                        st.divider()  # Add separator between expenses
-             
-                # Charts
-                st.subheader('Spending Over Time')
-                df_indexed = filtered_df.set_index('date')
-                daily = df_indexed.resample('D').sum()
-                st.line_chart(daily['amount'])
-
-                st.subheader('Category Breakdown')
-                breakdown = filtered_df.groupby('category')['amount'].sum()
-                # Pie chart
-                fig, ax = plt.subplots()
-                ax.pie(breakdown, labels=breakdown.index, autopct='%1.1f%%')
-                ax.set_title('Category Breakdown')
-                st.pyplot(fig)
-                
-                # Download Excel
-                towrite = io.BytesIO()
-                with pd.ExcelWriter(towrite, engine='openpyxl') as writer:
-                    filtered_df.to_excel(writer, sheet_name='Expenses', index=False)
-                st.download_button(
-                    label='Download data as Excel',
-                    data=towrite.getvalue(),
-                    file_name=f'expenses_{username}_{start_date}_{end_date}.xlsx',
-                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
-
-    with tab_budget:
-        df = get_expenses(db_file)
-        budget_df = get_budget_goals(db_file)
-        
-        st.subheader("Set Monthly Budget Goals")
-        col1, col2, col3 = st.columns([1, 1, 1])
-        with col1:
-            budget_cat = st.selectbox("Category", ['Food', 'Transport', 'Utilities', 'Entertainment', 'Health', 'Other'], key="budget_cat")
-        with col2:
-            cat_limit = st.number_input("Monthly Limit (₹)", min_value=0.0, step=100.0, format="%.2f", key="budget_amt")
-        with col3:
-            if st.button("Set Budget"):
-                set_budget_goal(db_file, budget_cat, cat_limit)
-                st.success(f"Budget goal set for {budget_cat}")
-                st.rerun()
-        
-        if not budget_df.empty:
-            st.subheader("Current Budget Goals")
-            # Create a container for budget goals
-            with st.container():
-                for _, budget_row in budget_df.iterrows():
-                    col1, col2 = st.columns([4, 1])
-                    with col1:
-                        st.write(f"**{budget_row['category']}**: ₹{budget_row['monthly_limit']:.2f}")
-                    with col2:
-                        if st.button("🗑️", key=f"del_budget_{budget_row['category']}", help=f"Remove budget for {budget_row['category']}"):
-                            delete_budget_goal(db_file, budget_row['category'])
-                            st.success(f"Budget for {budget_row['category']} removed!")
-                            st.rerun()
+    snapshot = ExpenseSnapshot(username, tenant)
 
-            if budget_df.empty:
-                st.info("No budget goals set yet.")
-        
-        if not df.empty:
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # Current month's spending by category
-            today = date.today()
-            month_start = date(today.year, today.month, 1)
-            month_mask = (df['date'].dt.date >= month_start) & (df['date'].dt.date <= today)
-            month_df = df.loc[month_mask].copy()
-            month_totals = month_df.groupby('category')['amount'].sum().reset_index()
-            
-            if not budget_df.empty:
-                st.subheader("Budget Progress (Current Month)")
-                for _, budget_row in budget_df.iterrows():
-                    cat = budget_row['category']
-                    limit = budget_row['monthly_limit']
-                    
-                    # Find actual spending
-                    cat_total = month_totals.loc[month_totals['category'] == cat, 'amount'].sum() if cat in month_totals['category'].values else 0
-                    
-                    # Calculate percentage
-                    percentage = min((cat_total / limit) * 100, 100) if limit > 0 else 0
-                    
-                    # Determine color based on percentage
-                    if percentage >= 100:
-                        color = "#ff4b4b"  # Red for over budget
-                        status_emoji = "🔴"
-                    elif percentage >= 80:
-                        color = "#ffa500"  # Orange/Yellow for warning
-                        status_emoji = "🟡"
-                    else:
-                        color = "#00ff00"  # Green for safe
-                        status_emoji = "🟢"
-                    
-                    # Display category info with status emoji
-                    st.write(f"{status_emoji} **{cat}**: ₹{cat_total:.2f} of ₹{limit:.2f} ({percentage:.1f}%)")
-                    
-                    # Custom colored progress bar using HTML
-                    progress_html = f"""
-                    <div style="background-color: #e0e0e0; border-radius: 10px; padding: 2px; margin: 5px 0;">
-                        <div style="background-color: {color}; width: {min(percentage, 100)}%; height: 20px; border-radius: 8px; 
-                                    display: flex; align-items: center; justify-content: center; color: white; font-weight: bold; font-size: 12px;">
-                            {percentage:.1f}%
-                        </div>
-                    </div>
-                    """
-                    st.markdown(progress_html, unsafe_allow_html=True)
-                    
-                    # Status messages
-                    if cat_total > limit:
-                        st.error(f"⚠️ Over budget by ₹{cat_total - limit:.2f} in {cat}")
-                    elif percentage > 80:
-                        st.warning(f"💡 You've used {percentage:.1f}% of your {cat} budget")
-                    elif percentage > 0:
-                        st.success(f"✅ {cat} spending is on track!")
-        else:
-            st.info("No expenses recorded yet. Add some expenses to see budget progress.")
-
-    with tab_delete_account:
-        st.write("## Delete Account")
-        st.warning("This action is irreversible. All your data will be permanently deleted.")
-        if st.button("Delete My Account"):
-            # Logic to delete user account and associated data
-            delete_user_account(username)
-            st.session_state.authenticated = False
-            st.session_state.username = ''
-            st.success("Your account has been deleted successfully.")
+    # Only the selected view runs, so the others do no database work on this rerun
+    view = st.radio('View', list(VIEWS), key='view', horizontal=True, label_visibility='collapsed')
+    span_name, render_view = VIEWS[view]
+    with trace_span(span_name, 'tab'):
+        render_view(snapshot)
 
     st.markdown("---")
     st.markdown("**GitHub Repository:** [Personal Expense Tracker](https://github.com/shubhpsd/expense-tracker)")
@@ -0,0 +1,143 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+import datagen
+
+# Requests per second through the local API (api.py, run as its own process)
+# against the UI path: a full Streamlit script rerun through AppTest, which is
+# what every click in the app costs.
+#   python benchmarks/bench_api.py --expenses 20000 --clients 8 --seconds 5
+#
+# API scenarios, each from --clients keep-alive connections:
+#   list_page    - GET /expenses, first page (served from the query cache)
+#   add_expense  - POST /expenses, one expense per request
+#   add_batch    - POST /expenses/batch with --batch-size expenses per request
+# UI scenarios, rerun back to back:
+#   ui_dashboard - script rerun with the dashboard view selected
+#   ui_add       - script rerun with the add view selected
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_DIR, 'app.py')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_server(port, process):
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError('api.py exited before it started serving')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('api.py did not start')
+
+def expense(i):
+    return {'date': date.today().isoformat(), 'category': 'Food', 'description': f'benchmark write {i}', 'amount': '99.00'}
+
+def api_requests_per_second(port, token, request, clients, seconds):
+    # request(i) -> (method, path, body); returns requests/s over all clients
+    counts, errors = [0] * clients, []
+    deadline = time.perf_counter() + seconds
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+
+    def client(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        try:
+            while time.perf_counter() < deadline:
+                method, path, body = request(counts[index])
+                conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 300:
+                    errors.append(response.status)
+                counts[index] += 1
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {'requests_per_second': sum(counts) / elapsed, 'errors': len(errors)}
+
+def ui_reruns_per_second(username, view, seconds):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=300)
+    at.session_state['authenticated'] = True
+    at.session_state['username'] = username
+    at.session_state['view'] = view
+    at.run()  # warm up
+    runs, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception)
+        runs += 1
+    return {'requests_per_second': runs / (time.perf_counter() - started), 'errors': 0}
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare local API throughput with Streamlit reruns')
+    parser.add_argument('--expenses', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent API connections')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each scenario')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        username = datagen.generate(tmp, 1, args.expenses)[0]
+        os.chdir(tmp)
+        port = free_port()
+        server = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'api.py'), '--port', str(port)],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            token = app.create_api_token(username)
+            app.get_connection_pool().close_all()
+            wait_for_server(port, server)
+            batch = [expense(i) for i in range(args.batch_size)]
+            scenarios = {
+                'list_page': lambda i: ('GET', '/expenses', None),
+                'add_expense': lambda i: ('POST', '/expenses', expense(i)),
+                'add_batch': lambda i: ('POST', '/expenses/batch', batch),
+            }
+            results = {name: api_requests_per_second(port, token, request, args.clients, args.seconds)
+                       for name, request in scenarios.items()}
+            results['add_batch']['expenses_per_second'] = results['add_batch']['requests_per_second'] * args.batch_size
+        finally:
+            server.terminate()
+            server.wait()
+        results['ui_dashboard'] = ui_reruns_per_second(username, 'View Dashboard', args.seconds)
+        results['ui_add'] = ui_reruns_per_second(username, 'Add New Expense', args.seconds)
+        app.get_connection_pool().close_all()
+        os.chdir(cwd)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.expenses} expenses, {args.clients} API clients, {args.seconds:g}s per scenario')
+    for name, timing in results.items():
+        extra = f"  ({timing['expenses_per_second']:.0f} expenses/s)" if 'expenses_per_second' in timing else ''
+        print(f"{name:13s} {timing['requests_per_second']:9.1f} requests/s  errors {timing['errors']}{extra}")
+
+if __name__ == '__main__':
+    main()
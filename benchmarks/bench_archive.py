@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+import datagen
+
+# Measures what archiving past years buys: the size of the live database and the
+# timings of a dashboard rerun over the current year (which only reads the live
+# database) and over the whole history (which also reads every archive), before
+# and after moving all but the current year into yearly archive files.
+#   python benchmarks/bench_archive.py --years 10 --expenses-per-day 10
+#
+# Reruns are timed with the query cache cleared.
+
+def rerun(tenant, start_date, end_date):
+    app.get_expense_bounds(tenant)
+    app.get_expense_page(tenant, start_date, end_date, 'All')
+    app.get_expense_summary(tenant, start_date, end_date, 'All')
+    app.get_daily_totals(tenant, start_date, end_date, 'All')
+
+def median_ms(run, repeat):
+    samples = []
+    for _ in range(repeat):
+        app.get_query_cache().clear()
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+def measure(tenant, today, repeat):
+    first = app.get_expense_bounds(tenant)[0]
+    app.get_connection_pool().close(tenant.db_file)
+    return {
+        'live_mb': os.path.getsize(tenant.db_file) / 1024 / 1024,
+        'current_year_ms': median_ms(lambda: rerun(tenant, date(today.year, 1, 1), today), repeat),
+        'all_years_ms': median_ms(lambda: rerun(tenant, first, today), repeat),
+        'search_ms': median_ms(lambda: app.search_expense_page(tenant, 'coffee', first, today, 'All'), repeat),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the live database before and after archiving past years')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--expenses-per-day', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    days = args.years * 365
+    today = date.today()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'expenses_archive.db')
+        app.init_db(db_file)
+        rows = datagen.generate_expense_rows(days * args.expenses_per_day, random.Random(0), days=days, end=today)
+        with app.db_connection(db_file) as conn:
+            conn.executemany('INSERT INTO expenses (date, category, description, amount_paise) VALUES (?, ?, ?, ?)', rows)
+        tenant = app.Tenant(db_file, app.FILE_USER_ID)
+        results = {'expenses': days * args.expenses_per_day, 'before': measure(tenant, today, args.repeat)}
+
+        started = time.perf_counter()
+        for year in app.live_years_before(db_file, today.year):
+            app.archive_year(db_file, year)
+        with app.db_connection(db_file) as conn:
+            conn.execute('VACUUM')
+        results['archive_seconds'] = time.perf_counter() - started
+        results['after'] = measure(tenant, today, args.repeat)
+        app.get_connection_pool().close_all()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['expenses']} expenses over {args.years} years, archived in {results['archive_seconds']:.2f}s")
+    for stage in ('before', 'after'):
+        timing = results[stage]
+        print(f"{stage:6s} live db {timing['live_mb']:7.1f} MB  current-year rerun {timing['current_year_ms']:7.2f} ms  "
+              f"all-years rerun {timing['all_years_ms']:7.2f} ms  search {timing['search_ms']:7.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+import datagen
+
+# How long backing up a receipt-heavy database takes and how long it holds up a
+# session that keeps adding expenses meanwhile. The longest stall is the slowest
+# write minus the slowest write with no backup running.
+#   python benchmarks/bench_backup.py --expenses 20000 --receipt-ratio 0.2
+#
+# Three modes:
+#   pooled    - one backup call through the app's pooled connection, the way an
+#               in-app backup would take it
+#   one-step  - one backup call on a separate connection
+#   stepped   - app.backup_database: page steps with pauses on a separate connection,
+#               then gzip (its copy time is also shown without the compression)
+# The run also times a backup of every database when none of them changed.
+
+MODES = ['pooled', 'one-step', 'stepped']
+
+def pooled(db_file, out_path):
+    with app.db_connection(db_file) as conn, app.closing(app.sqlite3.connect(out_path)) as dst:
+        conn.backup(dst)
+
+def one_step(db_file, out_path):
+    with app.closing(app.sqlite3.connect(db_file)) as src, app.closing(app.sqlite3.connect(out_path)) as dst:
+        src.backup(dst)
+
+def stepped(db_file, out_path):
+    return app.backup_database(db_file, f'{out_path}.gz')['copy_seconds']
+
+BACKUPS = {'pooled': pooled, 'one-step': one_step, 'stepped': stepped}
+
+def slowest_write(tenant, run):
+    # Runs run() while another thread adds expenses; returns the slowest write, run()'s duration and its result
+    latencies = []
+    done = threading.Event()
+
+    def writer():
+        while not done.is_set():
+            started = time.perf_counter()
+            app.add_expense(tenant, date.today().isoformat(), 'Food', 'benchmark write', 9900).result()
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.002)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.2)
+    started = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - started
+    time.sleep(0.2)
+    done.set()
+    thread.join()
+    return max(latencies), elapsed, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure backup duration and writer stalls')
+    parser.add_argument('--expenses', type=int, default=20000)
+    parser.add_argument('--receipt-ratio', type=float, default=0.2, help='Share of expenses with a receipt')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            rng = random.Random(0)
+            db_file = 'expenses_bench.db'
+            datagen.populate_user(db_file, args.expenses, rng, args.receipt_ratio,
+                                  datagen.make_receipt_images(datagen.BENCH_DISTINCT_RECEIPTS, rng))
+            tenant = app.Tenant(db_file, app.FILE_USER_ID)
+            baseline, _, _ = slowest_write(tenant, lambda: time.sleep(1))
+            results = {'mb': os.path.getsize(db_file) / 1024 / 1024, 'baseline_write_ms': baseline * 1000}
+            for mode in MODES:
+                write, elapsed, copied = slowest_write(tenant, lambda: BACKUPS[mode](db_file, f'{mode}.db'))
+                results[mode] = {'seconds': elapsed, 'copy_seconds': copied or elapsed,
+                                 'stall_ms': max(write - baseline, 0) * 1000}
+            app.backup_all('backups')
+            started = time.perf_counter()
+            app.backup_all('backups')
+            results['unchanged_ms'] = (time.perf_counter() - started) * 1000
+            app.get_connection_pool().close_all()
+        finally:
+            os.chdir(cwd)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.expenses} expenses, {results['mb']:.1f} MB; slowest write without a backup {results['baseline_write_ms']:.2f} ms")
+    for mode in MODES:
+        timing = results[mode]
+        print(f"{mode:9s} backup {timing['seconds']:7.2f} s (copy {timing['copy_seconds']:.2f} s)  "
+              f"longest writer stall {timing['stall_ms']:8.2f} ms")
+    print(f"backup run with nothing changed: {results['unchanged_ms']:.2f} ms")
+
+if __name__ == '__main__':
+    main()
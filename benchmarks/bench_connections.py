@@ -0,0 +1,80 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+import datagen
+
+# Compares dashboard reruns per second with a fresh sqlite3.connect per helper
+# call (the old behaviour) against the shared WAL connection pool, with the query
+# cache cleared before every rerun, and then with the query cache left on.
+#   python benchmarks/bench_connections.py --expenses 5000 --reruns 200
+
+@contextmanager
+def connect_per_call(db_file, scope=None):
+    conn = sqlite3.connect(db_file)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def populate(db_file, n_expenses):
+    datagen.populate_user(db_file, n_expenses, random.Random(0))
+
+def rerun(db_file):
+    # The database work done by one rerun of the dashboard and budget tabs
+    app.init_db(db_file)
+    tenant = app.Tenant(db_file, app.FILE_USER_ID)
+    min_date, max_date, categories = app.get_expense_bounds(tenant)
+    app.get_expenses(tenant, min_date, max_date, 'All')
+    app.get_expense_page(tenant, min_date, max_date, 'All')
+    app.get_expense_summary(tenant, min_date, max_date, 'All')
+    app.get_daily_totals(tenant, min_date, max_date, 'All')
+    app.get_budget_goals(tenant)
+    app.get_month_totals(tenant, date.today())
+
+def measure(db_file, reruns, cached=False):
+    rerun(db_file)  # warm up
+    started = time.perf_counter()
+    for _ in range(reruns):
+        if not cached:
+            app.get_query_cache().clear()
+        rerun(db_file)
+    return reruns / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-call and pooled SQLite connections')
+    parser.add_argument('--expenses', type=int, default=5000)
+    parser.add_argument('--reruns', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pooled_connection = app.db_connection
+        # Per-call connections keep the default rollback journal on their own file
+        app.db_connection = connect_per_call
+        before_db = os.path.join(tmp, 'expenses_before.db')
+        populate(before_db, args.expenses)
+        before = measure(before_db, args.reruns)
+
+        app.db_connection = pooled_connection
+        after_db = os.path.join(tmp, 'expenses_after.db')
+        populate(after_db, args.expenses)
+        after = measure(after_db, args.reruns)
+        cached = measure(after_db, args.reruns, cached=True)
+        app.get_connection_pool().close_all()
+
+    print(f'connect per call: {before:8.1f} reruns/s')
+    print(f'pooled WAL:       {after:8.1f} reruns/s ({after / before:.2f}x)')
+    print(f'with query cache: {cached:8.1f} reruns/s ({cached / before:.2f}x)')
+
+if __name__ == '__main__':
+    main()
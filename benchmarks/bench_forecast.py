@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+import datagen
+
+# Times the budget forecast and the unusual-day detection over a long history.
+# Each is timed twice: on daily totals that are already loaded (what a rerun pays
+# while the query cache is warm) and including the load from the rollups with the
+# query cache cleared.
+#   python benchmarks/bench_forecast.py --years 10 --expenses-per-day 5 --check
+#
+# --check exits non-zero when any of the four medians is over BUDGET_MS.
+
+BUDGET_MS = 100
+
+def median_ms(run, repeat, cached=True):
+    run()  # warm up
+    samples = []
+    for _ in range(repeat):
+        if not cached:
+            app.get_query_cache().clear()
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the spending forecast and anomaly detection')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--expenses-per-day', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--check', action='store_true', help=f'Fail if a median is over {BUDGET_MS} ms')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    days = args.years * 365
+    today = date.today()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'expenses_forecast.db')
+        app.init_db(db_file)
+        rows = datagen.generate_expense_rows(days * args.expenses_per_day, random.Random(0), days=days, end=today)
+        with app.db_connection(db_file) as conn:
+            conn.executemany('INSERT INTO expenses (date, category, description, amount_paise) VALUES (?, ?, ?, ?)', rows)
+        tenant = app.Tenant(db_file, app.FILE_USER_ID)
+
+        def forecast():
+            totals_df = app.get_daily_totals(tenant, app.month_start(today, app.FORECAST_MONTHS), today)
+            return app.forecast_month_end(totals_df, today)
+
+        def anomalies():
+            # The dashboard default: every day of the history
+            return app.spending_anomalies(app.daily_spending(app.get_daily_totals(tenant)))
+
+        results = {
+            'days': days,
+            'forecast_ms': median_ms(forecast, args.repeat),
+            'forecast_uncached_ms': median_ms(forecast, args.repeat, cached=False),
+            'anomalies_ms': median_ms(anomalies, args.repeat),
+            'anomalies_uncached_ms': median_ms(anomalies, args.repeat, cached=False),
+            'unusual_days': len(anomalies()),
+        }
+        app.get_connection_pool().close_all()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{args.years} years ({days} days), {args.expenses_per_day} expenses/day")
+        print(f"end-of-month forecast: {results['forecast_ms']:7.2f} ms  "
+              f"({results['forecast_uncached_ms']:.2f} ms with the query cache cleared)")
+        print(f"unusual days:          {results['anomalies_ms']:7.2f} ms  "
+              f"({results['anomalies_uncached_ms']:.2f} ms with the query cache cleared, {results['unusual_days']} found)")
+    timings = ['forecast_ms', 'forecast_uncached_ms', 'anomalies_ms', 'anomalies_uncached_ms']
+    if args.check and max(results[name] for name in timings) > BUDGET_MS:
+        sys.exit(f'Over the {BUDGET_MS} ms budget')
+
+if __name__ == '__main__':
+    main()
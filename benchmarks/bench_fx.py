@@ -0,0 +1,114 @@
+import argparse
+import bisect
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+import datagen
+
+# Times converting spending to the home currency over a long multi-currency
+# history. The conversion itself is timed on every expense row, as one merge_asof
+# against a per-row rate lookup (bisect into each currency's rate dates), and the
+# dashboard and budget reads that convert rollups are timed right after adding an
+# expense (which leaves the cached rates alone) and with the query cache warm.
+#   python benchmarks/bench_fx.py --years 10 --expenses-per-day 10 --foreign 0.3
+
+CURRENCIES = ['USD', 'EUR', 'GBP', 'THB']
+
+def median_ms(run, repeat, write=None):
+    run()  # warm up
+    samples = []
+    for _ in range(repeat):
+        if write is not None:
+            write()
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+def per_row_conversion(df, rates):
+    # The baseline: look up each row's rate on its own
+    by_currency = {}
+    for currency, group in rates.groupby('currency'):
+        by_currency[currency] = (list(group['date']), list(group['rate']))
+    amounts = []
+    for day, currency, amount in zip(df['date'], df['currency'], df['amount_paise']):
+        if currency == app.HOME_CURRENCY:
+            amounts.append(amount)
+            continue
+        days, values = by_currency[currency]
+        position = max(bisect.bisect_right(days, day) - 1, 0)
+        amounts.append(round(amount * values[position]))
+    return amounts
+
+def main():
+    parser = argparse.ArgumentParser(description='Time home-currency conversion of a multi-currency history')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--expenses-per-day', type=int, default=10)
+    parser.add_argument('--foreign', type=float, default=0.3, help='Share of expenses in another currency')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    days = args.years * 365
+    today = date.today()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'expenses_fx.db')
+        app.init_db(db_file)
+        rows = [
+            row + (rng.choice(CURRENCIES) if rng.random() < args.foreign else app.HOME_CURRENCY,)
+            for row in datagen.generate_expense_rows(days * args.expenses_per_day, rng, days=days, end=today)
+        ]
+        rates = [
+            (currency, (today - timedelta(days=day)).isoformat(), rng.uniform(1, 100))
+            for currency in CURRENCIES for day in range(days + 1)
+        ]
+        with app.db_connection(db_file) as conn:
+            conn.executemany('INSERT INTO expenses (date, category, description, amount_paise, currency) VALUES (?, ?, ?, ?, ?)', rows)
+        app.import_fx_rates(db_file, rates)
+        tenant = app.Tenant(db_file, app.FILE_USER_ID)
+        expenses = app.get_expenses(tenant)
+        fx_rates = app.get_fx_rates(db_file)
+        first, _, _ = app.get_expense_bounds(tenant)
+
+        def dashboard():
+            app.get_expense_summary(tenant, first, today, 'All')
+            app.get_daily_totals(tenant, first, today, 'All')
+
+        def budget():
+            app.get_month_totals(tenant, today)
+
+        def write():
+            app.add_expense(tenant, today.isoformat(), 'Food', 'benchmark write', 9900, currency=CURRENCIES[0]).result()
+
+        results = {
+            'expenses': len(rows),
+            'rates': len(rates),
+            'merge_asof_ms': median_ms(lambda: app.home_amounts(expenses, fx_rates), args.repeat),
+            'per_row_ms': median_ms(lambda: per_row_conversion(expenses, fx_rates), max(args.repeat // 5, 1)),
+            'dashboard_after_write_ms': median_ms(dashboard, args.repeat, write),
+            'dashboard_cached_ms': median_ms(dashboard, args.repeat),
+            'budget_after_write_ms': median_ms(budget, args.repeat, write),
+            'budget_cached_ms': median_ms(budget, args.repeat),
+        }
+        app.get_connection_pool().close_all()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['expenses']} expenses ({args.foreign:.0%} foreign), {results['rates']} daily rates")
+    print(f"convert every expense: merge_asof {results['merge_asof_ms']:8.2f} ms   per-row lookup {results['per_row_ms']:8.2f} ms")
+    print(f"dashboard totals:      after a write {results['dashboard_after_write_ms']:8.2f} ms   cached {results['dashboard_cached_ms']:8.2f} ms")
+    print(f"budget month totals:   after a write {results['budget_after_write_ms']:8.2f} ms   cached {results['budget_cached_ms']:8.2f} ms")
+
+if __name__ == '__main__':
+    main()
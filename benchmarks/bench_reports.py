@@ -0,0 +1,66 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+import datagen
+import manage
+
+# Throughput of `manage.py reports`: last month's report for every user, written
+# by one worker process and by a pool of them, in users per second.
+#   python benchmarks/bench_reports.py --users 24 --expenses 5000 --workers 1 4
+#
+# Each run writes into a fresh output directory, so nothing is skipped as done.
+
+def measure(jobs, month, fmt, out_dir, workers):
+    pending = [job + (month, fmt, out_dir) for job in jobs]
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=manage.limit_worker_memory, initargs=(2048,)) as pool:
+        statuses = [status for _, status, _ in pool.imap_unordered(manage.report_job, pending)]
+    elapsed = time.perf_counter() - started
+    return {
+        'seconds': elapsed,
+        'users_per_second': len(pending) / elapsed,
+        'failed': sum(status.startswith('failed') for status in statuses),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure batch report throughput for different worker counts')
+    parser.add_argument('--users', type=int, default=24)
+    parser.add_argument('--expenses', type=int, default=5000, help='Expenses per user')
+    parser.add_argument('--format', choices=app.REPORT_FORMATS, default='xlsx')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()])
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    month = app.month_start(date.today(), 1)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        rng = random.Random(0)
+        jobs = []
+        for i in range(args.users):
+            db_file = os.path.join(tmp, f'expenses_bench{i:04d}.db')
+            datagen.populate_user(db_file, args.expenses, rng)
+            jobs.append((db_file, app.FILE_USER_ID, f'bench{i:04d}'))
+        app.get_connection_pool().close_all()
+        for workers in args.workers:
+            results[workers] = measure(jobs, month, args.format, os.path.join(tmp, f'reports-{workers}'), workers)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.users} users x {args.expenses} expenses, {args.format} reports for {month:%Y-%m}')
+    for workers, timing in results.items():
+        print(f"{workers:3d} workers  {timing['seconds']:7.2f} s  {timing['users_per_second']:6.2f} users/s  "
+              f"failed {timing['failed']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Measures how long app.py takes to import and to render the login screen in a
+# fresh interpreter, and which heavy libraries are loaded by then. With --check
+# the results are compared against startup_budget.json and the exit status is
+# non-zero when the budget is exceeded, so it can run in CI.
+#   python benchmarks/bench_startup.py --runs 5 --check
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+HEAVY_MODULES = ['pandas', 'numpy', 'PIL', 'matplotlib', 'openpyxl', 'pyarrow', 'altair']
+
+IMPORT_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'modules': [m for m in HEAVY_MODULES if m in sys.modules]}))
+'''
+
+RENDER_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(APP_PATH, default_timeout=60).run()
+elapsed = time.perf_counter() - started
+assert not at.exception, at.exception
+print(json.dumps({'seconds': elapsed, 'modules': [m for m in HEAVY_MODULES if m in sys.modules]}))
+'''
+
+def run_probe(probe, workdir):
+    code = f'HEAVY_MODULES = {HEAVY_MODULES!r}\nAPP_PATH = {os.path.join(REPO_DIR, "app.py")!r}\n{probe}'
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    result = subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure(probe, runs):
+    samples = []
+    for _ in range(runs):
+        # A clean directory each run so users.db is created from scratch
+        with tempfile.TemporaryDirectory() as workdir:
+            samples.append(run_probe(probe, workdir))
+    return {
+        'median_seconds': statistics.median(sample['seconds'] for sample in samples),
+        'max_seconds': max(sample['seconds'] for sample in samples),
+        'modules': sorted({module for sample in samples for module in sample['modules']}),
+    }
+
+def check_budget(results, budget):
+    failures = []
+    if results['import']['median_seconds'] > budget['import_seconds']:
+        failures.append(f"import took {results['import']['median_seconds']:.2f}s (budget {budget['import_seconds']}s)")
+    if results['first_render']['median_seconds'] > budget['first_render_seconds']:
+        failures.append(f"first render took {results['first_render']['median_seconds']:.2f}s (budget {budget['first_render_seconds']}s)")
+    loaded = set(results['import']['modules']) | set(results['first_render']['modules'])
+    for module in budget['forbidden_modules']:
+        if module in loaded:
+            failures.append(f'{module} is imported before the login screen renders')
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app.py import time and time to first render')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--check', action='store_true', help='Fail when startup_budget.json is exceeded')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {
+        'import': measure(IMPORT_PROBE, args.runs),
+        'first_render': measure(RENDER_PROBE, args.runs),
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            print(f"{name:13s} median {result['median_seconds']:.3f}s  max {result['max_seconds']:.3f}s  "
+                  f"heavy modules: {', '.join(result['modules']) or 'none'}")
+
+    if args.check:
+        with open(BUDGET_FILE) as f:
+            failures = check_budget(results, json.load(f))
+        for failure in failures:
+            print(f'BUDGET EXCEEDED: {failure}', file=sys.stderr)
+        sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+import datagen
+
+# Compares the two storage backends: one expenses_<user>.db per user against a
+# single shared database. Generates per-user files, copies them into the shared
+# database with the same code as `manage.py migrate-to-shared`, then times
+# requests for randomly chosen users and compares the disk space both layouts use.
+#   python benchmarks/bench_storage.py --users 200 --expenses 500 --requests 300
+#
+# Each request opens the user's storage, adds an expense and does the reads of a
+# dashboard and budget rerun, with the query cache cleared. Two connection modes:
+#   pooled - connections stay open between requests
+#   reopen - every connection is closed first, like a user returning after the
+#            pool's idle timeout
+
+SHARED_DB = 'expenses.db'
+CONNECTION_MODES = ['pooled', 'reopen']
+
+def request(storage, username):
+    tenant = storage.open(username)
+    app.add_expense(tenant, date.today().isoformat(), 'Food', 'benchmark request', 9900).result()
+    min_date, max_date, categories = app.get_expense_bounds(tenant)
+    app.get_expense_page(tenant, min_date, max_date, 'All')
+    app.get_expense_summary(tenant, min_date, max_date, 'All')
+    app.get_daily_totals(tenant, min_date, max_date, 'All')
+    app.get_budget_goals(tenant)
+    app.get_month_totals(tenant, date.today())
+
+def measure(storage, usernames, requests, mode, seed):
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(requests):
+        username = rng.choice(usernames)
+        app.get_query_cache().clear()
+        if mode == 'reopen':
+            app.get_connection_pool().close_all()
+        started = time.perf_counter()
+        request(storage, username)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+    }
+
+def migrate(usernames):
+    storage = app.SharedStorage(SHARED_DB)
+    started = time.perf_counter()
+    for username in usernames:
+        storage.import_user_file(username, f'expenses_{username}.db')
+    return storage, time.perf_counter() - started
+
+def footprint(paths):
+    # Closing the pool checkpoints the WAL, so only the main files are left
+    app.get_connection_pool().close_all()
+    return {'files': len(paths), 'bytes': sum(os.path.getsize(path) for path in paths)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-user and shared expense storage')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--expenses', type=int, default=1000, help='Expenses per user')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        usernames = datagen.generate(tmp, args.users, args.expenses, seed=args.seed)
+        os.chdir(tmp)
+        try:
+            shared, migration_seconds = migrate(usernames)
+            per_user = app.PerUserStorage()
+            results = {
+                'migration': {'seconds': migration_seconds, 'users_per_second': len(usernames) / migration_seconds},
+                'footprint': {
+                    'per-user': footprint([f'expenses_{username}.db' for username in usernames]),
+                    'shared': footprint([SHARED_DB]),
+                },
+            }
+            for mode in CONNECTION_MODES:
+                results[mode] = {
+                    'per-user': measure(per_user, usernames, args.requests, mode, args.seed),
+                    'shared': measure(shared, usernames, args.requests, mode, args.seed),
+                }
+            app.get_connection_pool().close_all()
+        finally:
+            os.chdir(cwd)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.users} users x {args.expenses} expenses, migrated in {migration_seconds:.2f}s "
+          f"({results['migration']['users_per_second']:.1f} users/s)")
+    for layout in ('per-user', 'shared'):
+        used = results['footprint'][layout]
+        print(f"{layout:9s} disk: {used['bytes'] / 1024 / 1024:8.1f} MB in {used['files']} files")
+    for mode in CONNECTION_MODES:
+        for layout in ('per-user', 'shared'):
+            timing = results[mode][layout]
+            print(f"{mode:6s} {layout:9s} request: median {timing['median_ms']:7.2f} ms  p95 {timing['p95_ms']:7.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+# Stress test for concurrent writers: many sessions adding expenses to one shared
+# database at the same time, each waiting for its write to commit before the next.
+#   python benchmarks/bench_writes.py --sessions 32 --writes 200
+#
+# Two modes:
+#   commit-per-write - every write takes the pooled connection and commits on its
+#                      own (how add_expense worked before the write queue)
+#   group-commit     - writes go through the write queue and share commits
+
+MODES = ['commit-per-write', 'group-commit']
+
+def commit_per_write(tenant, description):
+    with app.db_connection(*tenant) as conn:
+        conn.execute('''
+        INSERT INTO expenses (user_id, date, category, description, amount_paise)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (tenant.user_id, date.today().isoformat(), 'Food', description, 9900))
+
+def group_commit(tenant, description):
+    app.add_expense(tenant, date.today().isoformat(), 'Food', description, 9900).result()
+
+WRITERS = {'commit-per-write': commit_per_write, 'group-commit': group_commit}
+
+def session(write, tenant, writes, latencies, errors):
+    for i in range(writes):
+        started = time.perf_counter()
+        try:
+            write(tenant, f'benchmark write {i}')
+        except Exception:
+            errors.append(1)
+        latencies.append(time.perf_counter() - started)
+
+def measure(db_file, mode, sessions, writes):
+    app.init_db(db_file)
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=session, args=(WRITERS[mode], app.Tenant(db_file, user_id), writes, latencies, errors))
+        for user_id in range(1, sessions + 1)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'writes_per_second': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        'errors': len(errors),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure concurrent write throughput with and without group commit')
+    parser.add_argument('--sessions', type=int, default=32, help='Concurrent writing sessions')
+    parser.add_argument('--writes', type=int, default=200, help='Writes per session')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in MODES:
+            results[mode] = measure(os.path.join(tmp, f'{mode}.db'), mode, args.sessions, args.writes)
+        app.get_connection_pool().close_all()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.sessions} sessions x {args.writes} writes')
+    for mode in MODES:
+        timing = results[mode]
+        print(f"{mode:16s} {timing['writes_per_second']:9.1f} writes/s  p50 {timing['p50_ms']:7.2f} ms  "
+              f"p95 {timing['p95_ms']:7.2f} ms  errors {timing['errors']}")
+
+if __name__ == '__main__':
+    main()
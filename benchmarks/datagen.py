@@ -0,0 +1,83 @@
+import argparse
+import io
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+# Synthetic users and expenses for the benchmarks. Creates users.db and one
+# expenses_<user>.db per user in the target directory, the same layout the app
+# uses. Every user's password is the username.
+#   python benchmarks/datagen.py /tmp/bench-data --users 10 --expenses 20000 --receipt-ratio 0.1
+
+BENCH_DESCRIPTIONS = ['Groceries', 'Metro card', 'Electricity bill', 'Movie night', 'Pharmacy', 'Lunch', 'Taxi',
+                      'Internet', 'Concert tickets', 'Doctor visit', 'Coffee', 'Books']
+BENCH_DISTINCT_RECEIPTS = 20
+
+def make_receipt_images(count, rng, size=(800, 1000)):
+    from PIL import Image
+    images = []
+    for i in range(count):
+        image = Image.effect_noise(size, 30 + i).convert('RGB')
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=85)
+        images.append(out.getvalue())
+    rng.shuffle(images)
+    return images
+
+def generate_expense_rows(count, rng, days=730, end=None):
+    end = end or date.today()
+    start = end - timedelta(days=days)
+    for i in range(count):
+        yield ((start + timedelta(days=rng.randrange(days + 1))).isoformat(),
+               rng.choice(app.EXPENSE_CATEGORIES),
+               f'{rng.choice(BENCH_DESCRIPTIONS)} #{i}',
+               rng.randrange(2000, 500001))  # paise
+
+def populate_user(db_file, expenses, rng, receipt_ratio=0.0, receipts=None):
+    app.init_db(db_file)
+    rows = list(generate_expense_rows(expenses, rng))
+    with app.db_connection(db_file) as conn:
+        receipt_hashes = [app.store_receipt(conn, image) for image in receipts or []]
+        conn.executemany('''
+        INSERT INTO expenses (date, category, description, amount_paise, receipt_hash)
+        VALUES (?, ?, ?, ?, ?)
+        ''', [row + ((rng.choice(receipt_hashes),) if receipt_hashes and rng.random() < receipt_ratio else (None,))
+              for row in rows])
+        for category in app.EXPENSE_CATEGORIES[:4]:
+            conn.execute('INSERT OR REPLACE INTO budget_goals (category, monthly_limit_paise) VALUES (?, ?)',
+                         (category, rng.choice([500000, 1000000, 2000000])))
+
+def generate(workdir, users, expenses, receipt_ratio=0.0, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(workdir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        app.init_user_db()
+        receipts = make_receipt_images(BENCH_DISTINCT_RECEIPTS, rng) if receipt_ratio > 0 else None
+        usernames = [f'bench{i:04d}' for i in range(users)]
+        for username in usernames:
+            app.signup_user(username, username)
+            populate_user(f'expenses_{username}.db', expenses, rng, receipt_ratio, receipts)
+    finally:
+        os.chdir(cwd)
+    return usernames
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic expense databases')
+    parser.add_argument('workdir')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--expenses', type=int, default=10000, help='Expenses per user')
+    parser.add_argument('--receipt-ratio', type=float, default=0.0, help='Share of expenses with a receipt')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    usernames = generate(args.workdir, args.users, args.expenses, args.receipt_ratio, args.seed)
+    app.get_connection_pool().close_all()
+    print(f'Generated {len(usernames)} users x {args.expenses} expenses in {args.workdir}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+import datagen
+
+# Times the expense tracker hot paths against synthetic data and prints the
+# results as JSON, so runs can be stored and compared across releases.
+#   python benchmarks/suite.py --users 5 --expenses 20000 --receipt-ratio 0.1 --output results.json
+#   python benchmarks/suite.py --compare results.json
+#
+# Each scenario runs in two cache modes:
+#   warm - nothing changed since the previous rerun, so cached reads are reused
+#   cold - another connection commits before every iteration, invalidating the
+#          query cache the way a write from another session would
+
+APP_PATH = os.path.join(REPO_DIR, 'app.py')
+CACHE_MODES = ['warm', 'cold']
+
+TOUCHES = itertools.count()
+
+def touch_database(db_file):
+    # A commit has to change a page for PRAGMA data_version to move, so the budget
+    # limits are nudged up and back down on alternate calls
+    delta = 1 if next(TOUCHES) % 2 else -1
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.execute('UPDATE budget_goals SET monthly_limit_paise = monthly_limit_paise + ?', (delta,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        'mean_ms': statistics.fmean(samples) * 1000,
+    }
+
+def time_scenario(run, tenant, mode, repeat):
+    run()  # warm up
+    samples = []
+    for _ in range(repeat):
+        if mode == 'cold':
+            touch_database(tenant.db_file)
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+def scenario_get_expenses(tenant):
+    return lambda: app.get_expenses(tenant)
+
+def scenario_dashboard(tenant):
+    def run():
+        min_date, max_date, categories = app.get_expense_bounds(tenant)
+        app.get_expense_page(tenant, min_date, max_date, 'All')
+        app.get_expense_summary(tenant, min_date, max_date, 'All')
+        totals_df = app.get_daily_totals(tenant, min_date, max_date, 'All')
+        anomalies = app.get_spending_anomalies(tenant, min_date, max_date, 'All')
+        app.cached_chart('daily', app.daily_spending(totals_df), lambda daily: app.spending_over_time_spec(daily, anomalies))
+        app.cached_chart('breakdown', app.category_breakdown(totals_df), app.category_breakdown_spec)
+    return run
+
+def scenario_budget_progress(tenant):
+    def run():
+        app.get_budget_goals(tenant)
+        app.get_month_totals(tenant, date.today())
+    return run
+
+def scenario_search(tenant):
+    # First page and summary of a search for one of the generated descriptions
+    def run():
+        app.get_search_summary(tenant, 'coff')
+        app.search_expense_page(tenant, 'coff')
+    return run
+
+def scenario_excel_export(tenant):
+    return lambda: app.export_expenses(tenant, 'Excel').close()
+
+def scenario_apptest_rerun(username, view):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=300)
+    at.session_state['authenticated'] = True
+    at.session_state['username'] = username
+    at.session_state['view'] = view
+
+    def run():
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception)
+    return run
+
+# Full script reruns with the given view selected, run through Streamlit's AppTest
+APPTEST_VIEWS = {
+    'apptest_rerun': 'Add New Expense',
+    'apptest_dashboard_rerun': 'View Dashboard',
+    'apptest_budget_rerun': 'Budget Management',
+}
+
+SCENARIOS = {
+    'get_expenses': scenario_get_expenses,
+    'dashboard': scenario_dashboard,
+    'budget_progress': scenario_budget_progress,
+    'search': scenario_search,
+    'excel_export': scenario_excel_export,
+}
+
+def bench_add_expense(tenant, count):
+    started = time.perf_counter()
+    for i in range(count):
+        app.add_expense(tenant, date.today().isoformat(), 'Food', f'benchmark insert {i}', 9900).result()
+    elapsed = time.perf_counter() - started
+    return {'runs': count, 'ops_per_second': count / elapsed, 'mean_ms': elapsed / count * 1000}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(args, workdir):
+    usernames = datagen.generate(workdir, args.users, args.expenses, args.receipt_ratio, args.seed)
+    os.chdir(workdir)
+    username = usernames[0]
+    db_file = f'expenses_{username}.db'
+    tenant = app.Tenant(db_file, app.FILE_USER_ID)
+    results = {}
+    for mode in CACHE_MODES:
+        results[mode] = {}
+        for name, scenario in SCENARIOS.items():
+            repeat = args.export_repeat if name == 'excel_export' else args.repeat
+            results[mode][name] = time_scenario(scenario(tenant), tenant, mode, repeat)
+        if not args.skip_apptest:
+            for name, view in APPTEST_VIEWS.items():
+                results[mode][name] = time_scenario(scenario_apptest_rerun(username, view), tenant, mode, args.apptest_repeat)
+    # Writes go to a separate user so they do not change what the read scenarios see
+    results['writes'] = {'add_expense': bench_add_expense(app.Tenant(f'expenses_{usernames[-1]}.db', app.FILE_USER_ID), args.inserts)}
+    results['cache'] = app.get_query_cache().stats()
+    results['storage'] = {
+        'expense_db_bytes': os.path.getsize(db_file),
+        'total_bytes': sum(os.path.getsize(f) for f in os.listdir('.') if f.endswith(('.db', '.db-wal'))),
+    }
+    return results
+
+def compare(current, baseline):
+    print(f"{'scenario':32s} {'baseline':>12s} {'current':>12s} {'ratio':>8s}")
+    for mode in CACHE_MODES:
+        for name, stats in current['results'].get(mode, {}).items():
+            before = baseline['results'].get(mode, {}).get(name)
+            if before:
+                ratio = stats['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+                print(f"{mode + '/' + name:32s} {before['median_ms']:10.2f}ms {stats['median_ms']:10.2f}ms {ratio:7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the expense tracker hot paths')
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--expenses', type=int, default=10000, help='Expenses per user')
+    parser.add_argument('--receipt-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--export-repeat', type=int, default=2)
+    parser.add_argument('--apptest-repeat', type=int, default=5)
+    parser.add_argument('--inserts', type=int, default=500)
+    parser.add_argument('--skip-apptest', action='store_true')
+    parser.add_argument('--workdir', help='Keep the generated data here instead of a temporary directory')
+    parser.add_argument('--output', help='Write the JSON results to this file')
+    parser.add_argument('--compare', help='Print a comparison against an earlier JSON result file')
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_suite(args, args.workdir or tmp)
+        app.get_connection_pool().close_all()
+        os.chdir(cwd)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'workdir')},
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == '__main__':
+    main()
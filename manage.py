@@ -0,0 +1,249 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+from datetime import date, datetime
+
+import app
+
+# Maintenance commands for the expense databases, run from the app directory:
+#   python manage.py rebuild-rollups [expenses_<user>.db ...]
+#   python manage.py rebuild-search-index [expenses_<user>.db ...]
+#   python manage.py process-receipts [expenses_<user>.db ...]
+#   python manage.py archive [--before YEAR] [expenses_<user>.db ...]
+#   python manage.py import-fx-rates RATES.csv [expenses_<user>.db ...]
+#   python manage.py reports [--month YYYY-MM] [--format xlsx|pdf] [--workers N] [expenses_<user>.db ...]
+#   python manage.py backup [--dir backups] [--force]
+#   python manage.py restore [--at 'YYYY-MM-DD HH:MM'] [--dir backups] [--list] [database ...]
+#   python manage.py create-token <username>
+#   python manage.py revoke-tokens <username>
+#   python manage.py migrate-to-shared [--shared-db expenses.db] [expenses_<user>.db ...]
+
+def per_user_db_files(paths):
+    return paths or sorted(glob.glob('expenses_*.db'))
+
+def expense_db_files(paths):
+    if not paths and app.STORAGE_MODE == 'shared':
+        return [app.SHARED_DB]
+    return per_user_db_files(paths)
+
+def rebuild_rollups(args):
+    for db_file in expense_db_files(args.db_files):
+        app.init_db(db_file)
+        with app.db_connection(db_file) as conn:
+            app.rebuild_rollups(conn, app.archived_daily_totals(conn, db_file))
+        print(f'Rebuilt rollups for {db_file}')
+
+def rebuild_search_index(args):
+    for db_file in expense_db_files(args.db_files):
+        app.init_db(db_file)
+        with app.db_connection(db_file) as conn:
+            app.rebuild_search_index(conn)
+        print(f'Rebuilt search index for {db_file}')
+
+def process_receipts(args):
+    for db_file in expense_db_files(args.db_files):
+        app.init_db(db_file)
+        processed = app.process_pending_receipts(db_file)
+        print(f'Processed {processed} receipts in {db_file}')
+
+def archive(args):
+    for db_file in expense_db_files(args.db_files):
+        app.init_db(db_file)
+        for year in app.live_years_before(db_file, args.before):
+            moved = app.archive_year(db_file, year)
+            print(f'Archived {moved} expenses from {year} in {db_file}')
+        # Give the space the moved rows used back to the filesystem
+        with app.db_connection(db_file) as conn:
+            conn.execute('VACUUM')
+        app.get_connection_pool().close(db_file)
+        print(f'{db_file} is now {os.path.getsize(db_file) / 1024 / 1024:.1f} MB')
+
+def import_fx_rates(args):
+    with open(args.rates_file, encoding='utf-8-sig', newline='') as stream:
+        rates = list(app.read_fx_rates_csv(stream))
+    for db_file in expense_db_files(args.db_files):
+        app.init_db(db_file)
+        app.import_fx_rates(db_file, rates)
+        print(f'Imported {len(rates)} exchange rates into {db_file}')
+
+def report_jobs(db_files):
+    # (db_file, user_id, username) for every user to report on
+    if not db_files and app.STORAGE_MODE == 'shared':
+        app.init_db(app.SHARED_DB)
+        with app.db_connection(app.USER_DB) as conn:
+            users = conn.execute('SELECT id, username FROM users ORDER BY username').fetchall()
+        return [(app.SHARED_DB, user_id, username) for user_id, username in users]
+    jobs = []
+    for db_file in per_user_db_files(db_files):
+        app.init_db(db_file)
+        jobs.append((db_file, app.FILE_USER_ID, os.path.basename(db_file)[len('expenses_'):-len('.db')]))
+    return jobs
+
+def limit_worker_memory(max_memory_mb):
+    # Caps each worker's address space, so one oversized report fails with a
+    # MemoryError instead of pushing the machine into swap
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    limit = max_memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def report_job(job):
+    db_file, user_id, username, month, fmt, out_dir = job
+    started = time.perf_counter()
+    try:
+        written = app.write_month_report(app.Tenant(db_file, user_id), username, month, fmt, out_dir)
+        return username, 'written' if written else 'empty', time.perf_counter() - started
+    except Exception as e:
+        return username, f'failed: {e!r}', time.perf_counter() - started
+    finally:
+        # Nothing is reused across users, so a long run does not grow the worker
+        app.get_query_cache().clear()
+        if user_id == app.FILE_USER_ID:
+            app.get_connection_pool().close(db_file)
+
+def reports(args):
+    month = date.fromisoformat(f'{args.month}-01') if args.month else app.month_start(date.today(), 1)
+    jobs = report_jobs(args.db_files)
+    pending = [
+        (db_file, user_id, username, month, args.format, args.out)
+        for db_file, user_id, username in jobs
+        if args.force or not os.path.isdir(app.report_dir(args.out, month, username))
+    ]
+    print(f'{len(pending)} of {len(jobs)} users to report on for {month:%Y-%m} '
+          f'({len(jobs) - len(pending)} already done) with {args.workers} workers')
+    # Workers must not inherit the connections opened by the migration checks
+    app.get_connection_pool().close_all()
+    counts = {'written': 0, 'empty': 0, 'failed': 0}
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.workers, initializer=limit_worker_memory, initargs=(args.max_memory_mb,),
+                              maxtasksperchild=args.tasks_per_worker) as pool:
+        for done, (username, status, seconds) in enumerate(pool.imap_unordered(report_job, pending), start=1):
+            counts[status.split(':')[0]] += 1
+            print(f'[{done}/{len(pending)}] {username}: {status} ({seconds:.2f}s)')
+    elapsed = time.perf_counter() - started
+    print(f"{counts['written']} reports written, {counts['empty']} users with no expenses, {counts['failed']} failed "
+          f'in {elapsed:.1f}s ({len(pending) / elapsed if elapsed else 0:.1f} users/s)')
+    if counts['failed']:
+        raise SystemExit(1)
+
+def backup(args):
+    started = time.perf_counter()
+    snapshot, stats = app.backup_all(args.dir, args.force)
+    for db_file, timing in stats.items():
+        print(f"{db_file}: {timing['bytes'] / 1024 / 1024:.1f} MB -> {timing['compressed_bytes'] / 1024 / 1024:.1f} MB "
+              f"in {timing['seconds']:.2f}s ({timing['steps']} steps, longest {timing['longest_step_seconds'] * 1000:.1f} ms)"
+              + ('' if timing['signature'] is not None else ', changed while copying'))
+    if snapshot is None:
+        print('Nothing changed since the last backup')
+    else:
+        print(f'Backed up {len(stats)} databases to {os.path.join(args.dir, snapshot)} in {time.perf_counter() - started:.1f}s')
+
+def restore(args):
+    if args.list:
+        for snapshot in app.list_backups(args.dir):
+            print(f"{datetime.strptime(snapshot, app.BACKUP_TIME_FORMAT):%Y-%m-%d %H:%M:%S} UTC  "
+                  f"{os.path.join(args.dir, snapshot)}")
+        return
+    at = datetime.fromisoformat(args.at) if args.at else None
+    try:
+        snapshot, restored = app.restore_backup(at, args.databases, args.dir)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f'Restored {len(restored)} databases from {os.path.join(args.dir, snapshot)}')
+
+def create_token(args):
+    app.init_user_db()
+    token = app.create_api_token(args.username)
+    if token is None:
+        raise SystemExit(f'No user named {args.username!r}')
+    print(f'API token for {args.username} (shown only once):')
+    print(token)
+
+def revoke_tokens(args):
+    app.init_user_db()
+    print(f'Revoked {app.revoke_api_tokens(args.username)} API tokens of {args.username}')
+
+def migrate_to_shared(args):
+    app.init_user_db()
+    storage = app.SharedStorage(args.shared_db)
+    for db_file in per_user_db_files(args.db_files):
+        username = os.path.basename(db_file)[len('expenses_'):-len('.db')]
+        copied = storage.import_user_file(username, db_file)
+        if copied is None:
+            print(f'Skipped {db_file}: no user named {username!r}')
+        else:
+            print(f'Copied {copied} expenses from {db_file}')
+    print(f'Run the app with EXPENSE_STORAGE=shared EXPENSE_SHARED_DB={args.shared_db}. '
+          'The per-user files were left in place.')
+
+def main():
+    parser = argparse.ArgumentParser(description='Expense tracker maintenance commands')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rebuild = commands.add_parser('rebuild-rollups', help='Recompute the daily and monthly category totals')
+    rebuild.add_argument('db_files', nargs='*', help='Expense databases (default: every expenses_*.db, or the shared database)')
+    rebuild.set_defaults(func=rebuild_rollups)
+
+    search = commands.add_parser('rebuild-search-index', help='Rebuild the full-text index over expense descriptions')
+    search.add_argument('db_files', nargs='*', help='Expense databases (default: every expenses_*.db, or the shared database)')
+    search.set_defaults(func=rebuild_search_index)
+
+    receipts = commands.add_parser('process-receipts', help='Recompress receipts and build thumbnails for unprocessed uploads')
+    receipts.add_argument('db_files', nargs='*', help='Expense databases (default: every expenses_*.db, or the shared database)')
+    receipts.set_defaults(func=process_receipts)
+
+    archiver = commands.add_parser('archive', help='Move the expenses of past years into read-only yearly archive files')
+    archiver.add_argument('db_files', nargs='*', help='Expense databases (default: every expenses_*.db, or the shared database)')
+    archiver.add_argument('--before', type=int, default=date.today().year, help='Archive every year before this one (default: the current year)')
+    archiver.set_defaults(func=archive)
+
+    rates = commands.add_parser('import-fx-rates', help=f'Load exchange rates to {app.HOME_CURRENCY} from a CSV with date, currency and rate columns')
+    rates.add_argument('rates_file', help=f'CSV file; rate is the {app.HOME_CURRENCY} value of one unit of currency from date on')
+    rates.add_argument('db_files', nargs='*', help='Expense databases (default: every expenses_*.db, or the shared database)')
+    rates.set_defaults(func=import_fx_rates)
+
+    report = commands.add_parser('reports', help='Write a monthly report with charts for every user')
+    report.add_argument('db_files', nargs='*', help='Per-user databases (default: every expenses_*.db, or every user of the shared database)')
+    report.add_argument('--month', help='Month to report on as YYYY-MM (default: last month)')
+    report.add_argument('--format', choices=app.REPORT_FORMATS, default='xlsx')
+    report.add_argument('--out', default='reports', help='Directory the reports are written under, one folder per month and user')
+    report.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: one per CPU)')
+    report.add_argument('--max-memory-mb', type=int, default=2048, help='Address space limit of each worker')
+    report.add_argument('--tasks-per-worker', type=int, default=50, help='Reports a worker writes before it is replaced')
+    report.add_argument('--force', action='store_true', help='Rewrite reports that already exist')
+    report.set_defaults(func=reports)
+
+    backups = commands.add_parser('backup', help='Snapshot every database that changed since the last backup, while the app runs')
+    backups.add_argument('--dir', default=app.BACKUP_DIR, help='Directory the snapshots are kept in')
+    backups.add_argument('--force', action='store_true', help='Copy unchanged databases too')
+    backups.set_defaults(func=backup)
+
+    restorer = commands.add_parser('restore', help='Restore the databases from a backup (stop the app first)')
+    restorer.add_argument('databases', nargs='*', help='Databases to restore, as named in the backup (default: all)')
+    restorer.add_argument('--at', help='Restore the newest backup taken at or before this UTC time (default: the newest)')
+    restorer.add_argument('--dir', default=app.BACKUP_DIR, help='Directory the snapshots are kept in')
+    restorer.add_argument('--list', action='store_true', help='List the backups instead of restoring')
+    restorer.set_defaults(func=restore)
+
+    token = commands.add_parser('create-token', help='Create a token for the local API (api.py)')
+    token.add_argument('username')
+    token.set_defaults(func=create_token)
+
+    revoke = commands.add_parser('revoke-tokens', help="Revoke every API token of a user")
+    revoke.add_argument('username')
+    revoke.set_defaults(func=revoke_tokens)
+
+    migrate = commands.add_parser('migrate-to-shared', help='Copy per-user expense databases into one shared database')
+    migrate.add_argument('db_files', nargs='*', help='Per-user databases to copy (default: every expenses_*.db)')
+    migrate.add_argument('--shared-db', default=app.SHARED_DB, help='Shared database to copy into')
+    migrate.set_defaults(func=migrate_to_shared)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Each test runs in an empty app directory. Pooled connections and cached reads
+    # are shared by the whole process, so they are dropped again afterwards.
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    app.get_connection_pool().close_all()
+    app.get_query_cache().clear()
+
+@pytest.fixture
+def tenant(workdir):
+    app.init_db('expenses_test.db')
+    return app.Tenant('expenses_test.db', app.FILE_USER_ID)
+
+def raw_totals(conn):
+    # What the rollups should hold, summed straight from the expenses
+    daily = conn.execute('''
+    SELECT user_id, date, category, currency, SUM(amount_paise), COUNT(*) FROM expenses
+    GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+    ''').fetchall()
+    monthly = conn.execute('''
+    SELECT user_id, substr(date, 1, 7), category, currency, SUM(amount_paise), COUNT(*) FROM expenses
+    GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+    ''').fetchall()
+    return daily, monthly
+
+def rollup_totals(conn):
+    return tuple(conn.execute(f'''
+    SELECT user_id, {key}, category, currency, amount_paise, expense_count FROM {table} ORDER BY 1, 2, 3, 4
+    ''').fetchall() for table, key in app.ROLLUP_TABLES.items())
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+
+import api
+import app
+
+@pytest.fixture
+def client(workdir):
+    app.init_user_db()
+    app.signup_user('alice', 'secret')
+    token = app.create_api_token('alice')
+    server = api.Api()
+
+    def request(method, path, body=None, token=token, headers=None):
+        # The status and payload the server would answer with, without the socket
+        if headers is None:
+            headers = {'authorization': f'Bearer {token}'} if token is not None else {}
+        request = api.Request(method, path, {}, headers, json.dumps(body).encode() if body is not None else b'')
+        try:
+            return asyncio.run(server.dispatch(request, None))
+        except api.ApiError as e:
+            return e.status, str(e)
+    return request
+
+def expense(**fields):
+    return dict({'date': '2025-01-01', 'category': 'Food', 'amount': '12.50'}, **fields)
+
+@pytest.mark.parametrize('token', [None, '', 'not-a-token'])
+def test_requests_need_a_valid_token(client, token):
+    assert client('GET', '/budgets', token=token)[0] == 401
+
+def test_other_schemes_are_refused(client):
+    assert client('GET', '/budgets', headers={'authorization': 'Basic YWxpY2U6c2VjcmV0'})[0] == 401
+
+def test_valid_token_adds_and_lists(client):
+    assert client('POST', '/expenses', expense()) == (201, {'added': 1})
+    status, body = client('GET', '/expenses')
+    assert status == 200
+    assert [item['amount'] for item in json.loads(body)['expenses']] == ['12.50']
+
+@pytest.mark.parametrize('amount', ['1e400', '12345678901234567890123', '-1', 'abc', 'NaN', 'Infinity', True, None, [1]])
+def test_bad_amounts_are_rejected(client, amount):
+    status, message = client('POST', '/expenses', expense(amount=amount))
+    assert status == 400
+    assert message.startswith('amount ')
+
+def test_bad_budget_limit_is_rejected(client):
+    status, message = client('PUT', '/budgets/Food', {'monthly_limit': '1e400'})
+    assert status == 400 and message.startswith('monthly_limit ')
+
+def test_unknown_category_is_rejected(client):
+    assert client('POST', '/expenses', expense(category='Groceries'))[0] == 400
+
+def test_missing_expense_and_endpoint(client):
+    assert client('DELETE', '/expenses/999')[0] == 404
+    assert client('GET', '/nowhere')[0] == 404
+    assert client('PATCH', '/budgets')[0] == 405
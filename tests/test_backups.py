@@ -0,0 +1,33 @@
+from datetime import datetime
+
+import pytest
+
+import app
+
+def expense_descriptions(tenant):
+    with app.db_connection(*tenant) as conn:
+        return [row[0] for row in conn.execute('SELECT description FROM expenses ORDER BY id')]
+
+def test_restore_to_a_point_in_time(tenant):
+    app.add_expense(tenant, '2025-01-01', 'Food', 'first', 100).result()
+    first, stats = app.backup_all()
+    assert first is not None and tenant.db_file in stats
+    app.add_expense(tenant, '2025-01-02', 'Food', 'second', 200).result()
+    second, _ = app.backup_all()
+    assert second > first
+    app.add_expense(tenant, '2025-01-03', 'Food', 'third', 300).result()
+
+    app.restore_backup(datetime.strptime(first, app.BACKUP_TIME_FORMAT))
+    assert expense_descriptions(tenant) == ['first']
+    app.restore_backup()
+    assert expense_descriptions(tenant) == ['first', 'second']
+
+def test_unchanged_databases_are_not_backed_up_again(tenant):
+    app.add_expense(tenant, '2025-01-01', 'Food', 'first', 100).result()
+    assert app.backup_all()[0] is not None
+    assert app.backup_all() == (None, {})
+
+def test_restore_before_the_first_backup(tenant):
+    app.backup_all()
+    with pytest.raises(ValueError):
+        app.restore_backup(datetime(2000, 1, 1))
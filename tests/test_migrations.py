@@ -0,0 +1,48 @@
+import sqlite3
+from contextlib import closing
+
+import app
+from conftest import raw_totals, rollup_totals
+
+def make_baseline_db(db_file):
+    # The schema the first release created, before any migration existed
+    with closing(sqlite3.connect(db_file)) as conn:
+        conn.execute('''
+        CREATE TABLE expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT,
+            amount REAL NOT NULL,
+            receipt_photo TEXT
+        )
+        ''')
+        conn.execute('CREATE TABLE budget_goals (category TEXT PRIMARY KEY, monthly_limit REAL NOT NULL)')
+        conn.executemany('INSERT INTO expenses (date, category, description, amount) VALUES (?, ?, ?, ?)', [
+            ('2025-01-05', 'Food', 'Lunch', 120.5),
+            ('2025-01-05', 'Food', 'Coffee', 0.1),
+            ('2025-01-20', 'Transport', 'Metro card', 19.99),
+            ('2025-02-01', 'Food', 'Groceries', 1043.75),
+        ])
+        conn.execute('INSERT INTO budget_goals VALUES (?, ?)', ('Food', 5000.5))
+        conn.commit()
+
+def test_baseline_database_migrates_to_latest(workdir):
+    make_baseline_db('expenses_old.db')
+    app.init_db('expenses_old.db')
+    app.get_connection_pool().close_all()
+    with closing(sqlite3.connect('expenses_old.db')) as conn:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == len(app.EXPENSE_DB_MIGRATIONS)
+        assert conn.execute('SELECT description, amount_paise, currency FROM expenses ORDER BY id').fetchall() == [
+            ('Lunch', 12050, 'INR'), ('Coffee', 10, 'INR'), ('Metro card', 1999, 'INR'), ('Groceries', 104375, 'INR'),
+        ]
+        assert conn.execute('SELECT category, monthly_limit_paise FROM budget_goals').fetchall() == [('Food', 500050)]
+        assert rollup_totals(conn) == raw_totals(conn)
+
+def test_migrations_run_once(workdir):
+    make_baseline_db('expenses_old.db')
+    app.init_db('expenses_old.db')
+    app.init_db('expenses_old.db')
+    with app.db_connection('expenses_old.db') as conn:
+        assert conn.execute('SELECT COUNT(*) FROM expenses').fetchone()[0] == 4
+        assert rollup_totals(conn) == raw_totals(conn)
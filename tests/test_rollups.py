@@ -0,0 +1,34 @@
+import app
+from conftest import raw_totals, rollup_totals
+
+def assert_rollups_match(tenant):
+    with app.db_connection(*tenant) as conn:
+        daily, monthly = raw_totals(conn)
+        assert daily and rollup_totals(conn) == (daily, monthly)
+
+def test_rollups_follow_inserts_updates_and_deletes(tenant):
+    for day, category, amount in [('2025-03-01', 'Food', 250), ('2025-03-01', 'Food', 100),
+                                  ('2025-03-15', 'Health', 999), ('2025-04-02', 'Food', 4000)]:
+        app.add_expense(tenant, day, category, 'expense', amount).result()
+    app.add_expense(tenant, '2025-03-01', 'Food', 'abroad', 1500, currency='USD').result()
+    assert_rollups_match(tenant)
+
+    with app.db_connection(*tenant) as conn:
+        conn.execute("UPDATE expenses SET amount_paise = 300 WHERE amount_paise = 250")
+        conn.execute("UPDATE expenses SET category = 'Transport' WHERE amount_paise = 999")
+        conn.execute("UPDATE expenses SET date = '2025-05-31' WHERE amount_paise = 4000")
+        conn.commit()
+    assert_rollups_match(tenant)
+
+    assert app.delete_expense(tenant, 1).result() == 1
+    assert app.delete_expense(tenant, 1).result() == 0
+    assert_rollups_match(tenant)
+
+def test_rebuild_matches_triggers(tenant):
+    app.add_expense(tenant, '2025-06-01', 'Other', 'one', 123).result()
+    app.add_expense(tenant, '2025-06-02', 'Other', 'two', 456).result()
+    with app.db_connection(*tenant) as conn:
+        before = rollup_totals(conn)
+        app.rebuild_rollups(conn)
+        conn.commit()
+        assert rollup_totals(conn) == before == raw_totals(conn)